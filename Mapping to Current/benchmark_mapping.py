@@ -0,0 +1,151 @@
+"""
+Earthquake Observation Mapping Benchmark
+Times the column mapping step and the full migration pipeline at increasing row counts
+to check they scale linearly
+"""
+
+import os
+import sys
+import time
+import logging
+import argparse
+import tempfile
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+
+from mapping import EarthquakeDataMapper
+
+ROW_COUNTS = [1000, 10000, 100000, 1000000]
+REPEATS = 3
+
+# Per-row time may grow this much from the smallest to the largest size before it is flagged
+SCALING_TOLERANCE = 2.0
+
+# Coordinate columns are drawn uniformly over the real extent so synthetic stations do not stack up
+COORDINATE_COLUMNS = ['latitude', 'longitude', 'orig_lat', 'orig_lon']
+
+
+def synthesize_rows(df, n_rows, seed=0):
+    """Generate n_rows records with the real column set, sampling each column's own values"""
+    rng = np.random.default_rng(seed)
+    columns = {}
+    for col in df.columns:
+        values = df[col].to_numpy()
+        if col in COORDINATE_COLUMNS:
+            numeric = pd.to_numeric(df[col], errors='coerce')
+            columns[col] = rng.uniform(numeric.min(), numeric.max(), n_rows).round(6)
+        else:
+            columns[col] = values[rng.integers(0, len(values), n_rows)]
+    return pd.DataFrame(columns)
+
+
+def time_mapping(map_func, source_df):
+    """Return the best wall time over REPEATS runs of a mapping function"""
+    best = float('inf')
+    for _ in range(REPEATS):
+        start = time.perf_counter()
+        map_func(source_df)
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def run_pipeline_benchmark(sources, n_rows, work_dir, deduplicate=True, trace_memory=False):
+    """Run load, map, finalize, consolidate and write on synthetic inputs totalling n_rows across events"""
+    mapper = EarthquakeDataMapper(instrument=True, trace_memory=trace_memory, use_source_cache=False)
+    # Peak RSS from here on belongs to this run, not to whatever the process held before
+    isolated = mapper.reset_peak_rss()
+    for name, source_df in sources.items():
+        input_file = os.path.join(work_dir, f"{name.lower()}_{n_rows}.csv")
+        synthesize_rows(source_df, n_rows // len(sources)).to_csv(input_file, index=False)
+        mapper.set_event_source(name, input_file)
+
+    start = time.perf_counter()
+    event_results = mapper.run_pipeline(processes=1)
+    consolidated = mapper.consolidate_events([result['current'] for result in event_results.values()], deduplicate)
+    with mapper.measure_stage('write', 'Consolidated') as stage:
+        consolidated.to_csv(os.path.join(work_dir, f"consolidated_{n_rows}.csv"), index=False)
+        stage['rows'] = len(consolidated)
+    elapsed = time.perf_counter() - start
+
+    totals = mapper.write_stage_metrics(os.path.join(work_dir, f"migration_metrics_{n_rows}.json"))
+    return elapsed, totals, isolated
+
+
+def quiet_logging():
+    """Only report errors from the mapper while benchmarking"""
+    logging.getLogger('mapping').setLevel(logging.ERROR)
+    logging.getLogger('metadata').setLevel(logging.ERROR)
+
+
+def run_pipeline_in_process(sources, n_rows, work_dir, deduplicate=True, trace_memory=False):
+    """Run one pipeline benchmark in a separate process, so the parent's data does not count towards its peak"""
+    context = multiprocessing.get_context('spawn')
+    with ProcessPoolExecutor(max_workers=1, mp_context=context, initializer=quiet_logging) as executor:
+        return executor.submit(run_pipeline_benchmark, sources, n_rows, work_dir, deduplicate, trace_memory).result()
+
+
+def check_scaling(name, timings):
+    """Warn when time per row grows faster than linear between the smallest and largest run"""
+    sizes = sorted(timings)
+    first, last = timings[sizes[0]] / sizes[0], timings[sizes[-1]] / sizes[-1]
+    if len(sizes) > 1 and last > first * SCALING_TOLERANCE:
+        print(f"WARNING: {name} time per row grew {last / first:.1f}x from {sizes[0]} to {sizes[-1]} rows")
+
+
+def main():
+    """Main execution function"""
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--sizes', type=int, nargs='+', default=ROW_COUNTS,
+                        help='row counts per event for mapping, and in total across events for the pipeline')
+    parser.add_argument('--mapping-only', action='store_true', help='skip the full pipeline benchmark')
+    parser.add_argument('--no-deduplicate', action='store_true', help='skip duplicate flagging when consolidating')
+    parser.add_argument('--trace-memory', action='store_true', help='record per-stage peaks with tracemalloc (slower)')
+    args = parser.parse_args()
+
+    quiet_logging()
+    mapper = EarthquakeDataMapper()
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+
+    sources = {
+        'Napa': mapper.load_napa_data(os.path.join(base_dir, 'napa_observations.csv')),
+        'Ridgecrest': mapper.load_ridgecrest_data(os.path.join(base_dir, 'ridgecrest_observations.csv')),
+    }
+    sources = {name: df for name, df in sources.items() if df is not None}
+
+    print("Mapping step")
+    print(f"{'Dataset':<12}{'Rows':>10}{'Seconds':>12}{'us/row':>10}")
+    for name, source_df in sources.items():
+        timings = {}
+        for n_rows in args.sizes:
+            elapsed = time_mapping(lambda df: mapper.map_event(name, df), synthesize_rows(source_df, n_rows))
+            timings[n_rows] = elapsed
+            print(f"{name:<12}{n_rows:>10}{elapsed:>12.4f}{elapsed / n_rows * 1e6:>10.2f}")
+        check_scaling(f"{name} mapping", timings)
+
+    if args.mapping_only:
+        return
+
+    # Each size runs in its own process; without tracing, the peak is its resident memory high-water mark
+    print("\nFull pipeline (rows across all events)")
+    print(f"{'Rows':>10}{'Seconds':>10}{'us/row':>9}{'Traced MB' if args.trace_memory else 'Peak RSS':>10}  Stages (s)")
+    timings = {}
+    with tempfile.TemporaryDirectory() as work_dir:
+        for n_rows in args.sizes:
+            elapsed, totals, isolated = run_pipeline_in_process(sources, n_rows, work_dir, not args.no_deduplicate,
+                                                                args.trace_memory)
+            timings[n_rows] = elapsed
+            stages = ', '.join(f"{stage} {total['seconds']:.2f}" for stage, total in totals.items())
+            peaks = [total['peak_mb'] if args.trace_memory else total['max_rss_mb'] for total in totals.values()]
+            peak = max((value for value in peaks if value is not None), default=float('nan'))
+            print(f"{n_rows:>10}{elapsed:>10.2f}{elapsed / n_rows * 1e6:>9.2f}{peak:>10.0f}  {stages}")
+            if not (isolated or args.trace_memory):
+                print("  (peak RSS could not be reset on this platform and may include earlier runs)")
+            sys.stdout.flush()
+    check_scaling("Pipeline", timings)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+"""
+Slip Kinematics for Mapped Earthquake Observations
+Vectorized net slip, rake and slip components with bounds, and grouped circular azimuth statistics
+"""
+
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Field sheets record '>10.5' (at least), '<3', '13-19' (range) and '5*' / '345**' (flagged as uncertain)
+MEASUREMENT_PATTERN = r'^\s*(?P<op>[<>]=?)?\s*(?P<low>\d+(?:\.\d+)?)\s*(?:-\s*(?P<high>\d+(?:\.\d+)?))?\s*\**\s*$'
+
+# Slip sense words -> (component, sign) in the Aki-Richards convention: left-lateral and reverse are positive
+SENSE_TOKENS = {
+    'left': ('lateral', 1), 'll': ('lateral', 1), 'sinistral': ('lateral', 1),
+    'right': ('lateral', -1), 'rl': ('lateral', -1), 'dextral': ('lateral', -1),
+    'reverse': ('dip', 1), 'thrust': ('dip', 1),
+    'normal': ('dip', -1), 'extensional': ('dip', -1),
+}
+
+
+def parse_measurements(values):
+    """Preferred value and lower/upper bounds of measurement columns that may hold bounds or ranges as text"""
+    # Parse each distinct value once, then expand to rows
+    codes, uniques = pd.factorize(pd.Series(values, dtype=object))
+    uniques = pd.Series(uniques, dtype=object)
+    number = pd.to_numeric(uniques, errors='coerce').to_numpy(dtype=np.float64)
+    parts = uniques.astype(str).str.extract(MEASUREMENT_PATTERN)
+    low = np.where(np.isnan(number), np.array(parts['low'], dtype=np.float64), number)
+    high = np.array(parts['high'], dtype=np.float64)
+    op = parts['op'].fillna('').astype(str)
+
+    pref = np.where(np.isnan(high), low, (low + high) / 2)
+    high = np.where(np.isnan(high), low, high)
+    at_least, at_most = op.str.startswith('>').to_numpy(), op.str.startswith('<').to_numpy()
+    pref[at_least | at_most] = np.nan
+    high[at_least] = np.inf
+    low[at_most] = 0
+    return tuple(np.append(array, np.nan)[codes] for array in (pref, low, high))
+
+
+def slip_sense_signs(senses):
+    """Lateral and dip-slip signs of slip sense text: +1/-1, 0 when the sense excludes it, NaN when unrecorded"""
+    codes, uniques = pd.factorize(pd.Series(senses, dtype=object))
+    lateral = np.full(len(uniques) + 1, np.nan)
+    dip = np.full(len(uniques) + 1, np.nan)
+    for position, sense in enumerate(uniques):
+        components = dict(SENSE_TOKENS[token] for token in
+                          str(sense).lower().replace('-', ' ').replace('/', ' ').split() if token in SENSE_TOKENS)
+        if components:
+            lateral[position] = components.get('lateral', 0)
+            dip[position] = components.get('dip', 0)
+    return lateral[codes], dip[codes]
+
+
+def component(values, sign):
+    """A slip component, counting unmeasured ones as zero unless the recorded sense says they exist"""
+    return np.where(np.isnan(values) & ((sign == 0) | np.isnan(sign)), 0, np.abs(values))
+
+
+def slip_components(lateral, heave, vertical, dip, lateral_sign, dip_sign):
+    """Horizontal and vertical components of slip, and the dip-slip magnitude within the fault plane"""
+    lateral = component(lateral, lateral_sign)
+    vertical = component(vertical, dip_sign)
+
+    # Horizontal extension across the fault is the heave, or follows from throw and dip; without
+    # either the fault is taken as vertical
+    with np.errstate(divide='ignore', invalid='ignore'):
+        from_dip = vertical / np.tan(np.radians(dip))
+    across = np.where(np.isnan(heave), np.where(np.isnan(from_dip), 0, from_dip), np.abs(heave))
+
+    horizontal = np.hypot(lateral, across)
+    dip_slip = np.hypot(across, vertical)
+    return horizontal, vertical, lateral, dip_slip
+
+
+def rake_degrees(lateral, dip_slip, lateral_sign, dip_sign):
+    """Rake in degrees (-180, 180]: 0 left-lateral, 180 right-lateral, 90 reverse, -90 normal"""
+    signed_lateral = np.where(lateral == 0, 0, lateral * lateral_sign)
+    signed_dip = np.where(dip_slip == 0, 0, dip_slip * dip_sign)
+    rake = np.degrees(np.arctan2(signed_dip, signed_lateral))
+    return np.where((lateral == 0) & (dip_slip == 0), np.nan, rake)
+
+
+def slip_kinematics(lateral, heave, vertical, dip, net, plunge, lateral_sign, dip_sign):
+    """Derive net slip, rake and slip components with bounds from (preferred, low, high) measurement arrays"""
+    derived = {}
+    # Bounds follow from the monotonic formulas: steeper dips give less horizontal extension
+    for label, index, dip_index in (('', 0, 0), ('min', 1, 2), ('max', 2, 1)):
+        horizontal, vertical_slip, lateral_slip, dip_slip = slip_components(
+            lateral[index], heave[index], vertical[index], dip[dip_index], lateral_sign, dip_sign)
+        net_slip = np.hypot(horizontal, vertical_slip)
+
+        # Measured net slip takes precedence; with a plunge it also gives the components when no
+        # separation was measured
+        measured = ~np.isnan(net[index])
+        unmeasured = np.isnan(lateral[index]) & np.isnan(heave[index]) & np.isnan(vertical[index])
+        from_vector = measured & unmeasured & ~np.isnan(plunge)
+        horizontal = np.where(from_vector, net[index] * np.cos(np.radians(plunge)), horizontal)
+        vertical_slip = np.where(from_vector, net[index] * np.sin(np.radians(plunge)), vertical_slip)
+        net_slip = np.where(measured, net[index], net_slip)
+
+        # Records with nothing measured have no slip values rather than zero slip
+        missing = unmeasured & ~from_vector
+        horizontal[missing] = vertical_slip[missing] = np.nan
+        net_slip = np.where(unmeasured & ~measured, np.nan, net_slip)
+
+        suffix = f"_{label}" if label else ''
+        derived[f"horizontal{suffix}"] = horizontal
+        derived[f"vertical{suffix}"] = vertical_slip
+        derived[f"net{suffix}"] = net_slip
+        if not label:
+            derived['rake'] = np.where(unmeasured, np.nan, rake_degrees(lateral_slip, dip_slip, lateral_sign, dip_sign))
+
+    # A measured preferred value next to bounds derived from separations still lies within them
+    for name in ('horizontal', 'vertical', 'net'):
+        derived[f"{name}_min"] = np.fmin(derived[f"{name}_min"], derived[name])
+        derived[f"{name}_max"] = np.fmax(derived[f"{name}_max"], derived[name])
+
+    # Open-ended bounds such as '>10.5' leave the upper bound unknown
+    return {name: np.where(np.isinf(values), np.nan, values) for name, values in derived.items()}
+
+
+def circular_statistics(degrees, codes, n_groups, axial=False):
+    """Grouped circular mean, mean resultant length, circular variance and standard deviation of angles
+
+    Axial data such as fault strikes (where 10 and 190 are the same line) are doubled before averaging.
+    """
+    valid = ~np.isnan(degrees) & (codes >= 0)
+    factor = 2 if axial else 1
+    radians = np.radians(degrees[valid] * factor)
+    codes = codes[valid]
+
+    count = np.bincount(codes, minlength=n_groups)
+    sum_cos = np.bincount(codes, np.cos(radians), minlength=n_groups)
+    sum_sin = np.bincount(codes, np.sin(radians), minlength=n_groups)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        resultant = np.hypot(sum_cos, sum_sin) / count
+        mean = np.mod(np.degrees(np.arctan2(sum_sin, sum_cos)) / factor, 360 / factor)
+        std = np.degrees(np.sqrt(-2 * np.log(resultant))) / factor
+    mean[count == 0] = np.nan
+    return {
+        'count': count,
+        'mean_azimuth': mean,
+        'resultant_length': resultant,
+        'circular_variance': 1 - resultant,
+        'circular_std_deg': std,
+    }
@@ -6,8 +6,36 @@ Maps Napa (2014) and Ridgecrest (2019) datasets to Current schema format
 import pandas as pd
 import numpy as np
 import warnings
-from datetime import datetime
+from datetime import datetime, timedelta
 import logging
+import os
+import codecs
+import hashlib
+import json
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from concurrent.futures import ProcessPoolExecutor
+
+try:
+    import resource
+except ImportError:  # Not available on Windows; peak RSS is then not recorded
+    resource = None
+
+from spatial_index import ObservationSpatialIndex
+from metadata import AttributeSchema, file_content_hash
+from source_fetch import SourceFetcher, FetchError, SCIENCEBASE_ITEMS
+from observation_store import ObservationStore, ESRI_COLUMN_TYPES
+from text_index import ObservationTextIndex
+from kinematics import parse_measurements, slip_sense_signs, slip_kinematics, circular_statistics
+
+try:
+    import pyarrow as pa
+    import pyarrow.dataset as ds
+    import pyarrow.fs as pafs
+except ImportError:  # Columnar output is optional
+    pa = None
 
 # Set up logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
@@ -16,7 +44,37 @@ logger = logging.getLogger(__name__)
 class EarthquakeDataMapper:
     """Class to handle mapping of earthquake observation data to current schema"""
     
-    def __init__(self):
+    def __init__(self, typed_schema=False, schema_file=None, use_source_cache=True, cache_dir=None,
+                 instrument=False, trace_memory=True, fetch_cache_dir=None, offline=None):
+        # Cast finalized frames to compact dtypes from the current schema instead of filling with ''
+        self.typed_schema = typed_schema
+        self.schema_file = schema_file or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '..', 'PostEQ_schema_comparison', 'post_ridgecrest_schema.csv')
+        self.schema_types = None
+        
+        # One migration timestamp per run so repeated mappings stamp identical CreationDate/EditDate
+        self.migration_time = datetime.now().replace(microsecond=0)
+        
+        # Opt-in per-stage wall time, throughput and memory; tracemalloc gives per-stage peaks but
+        # slows allocation-heavy stages several-fold, so timing runs can turn it off
+        self.instrument = instrument
+        self.trace_memory = trace_memory
+        self.stage_metrics = []
+        
+        # Parsed Excel sources are cached beside the source file (or in cache_dir)
+        self.use_source_cache = use_source_cache
+        self.cache_dir = cache_dir
+        
+        # URL sources are downloaded once into a content-addressed cache; offline serves only from it
+        self.fetcher = SourceFetcher(fetch_cache_dir, offline)
+        
+        # ScienceBase files holding each event's observations and FGDC metadata
+        self.sciencebase_files = {
+            'Napa': ('Observations.txt', 'Observations.xml'),
+            'Ridgecrest': ('CSV_File_Ridgecrest_Observations_Slip_Prov_Rel_1.zip',
+                           'Ridgecrest_Observations_Slip_Prov_Rel_1.xml'),
+        }
+        
         self.napa_mapping = {
             'stnid': 'Station_ID', 
             'intid': None, 
@@ -126,178 +184,971 @@ class EarthquakeDataMapper:
             'Facility_Affected', 'Utility_Affected', 'Damage_Severity', 'GlobalID',
             'CreationDate', 'Creator', 'EditDate', 'Editor'
         ]
+        
+        # Event registry: each event declares its mapping, source tag and source file
+        self.events = {}
+        module_dir = os.path.dirname(os.path.abspath(__file__))
+        self.register_event('Napa', self.napa_mapping, 'Napa 2014', 'Napa_Migration',
+                            date_formats={'obs_date': '%Y:%m:%d'}, timezone='America/Los_Angeles',
+                            metadata_file=os.path.join(module_dir, '..', 'Observations.xml'))
+        self.register_event('Ridgecrest', self.ridgecrest_mapping, 'Ridgecrest 2019', 'Ridgecrest_Migration',
+                            date_formats={'obs_date': '%Y-%m-%dT%H:%M:%S%z'}, timezone='America/Los_Angeles',
+                            metadata_file=os.path.join(module_dir, 'CSV_File_Ridgecrest_Observations_Slip_Prov_Rel_1',
+                                                       'Ridgecrest_Observations_Slip_Prov_Rel_1.xml'))
+        
+        # Parsed date values keyed by (format, timezone), so each distinct string is parsed once
+        self.parsed_dates = {}
+        
+        # Compiled FGDC attribute schemas per event, and extension column types derived from them
+        self.event_metadata = {}
+        self.metadata_types = None
+        
+        # Free-text fields that are never stored as categoricals
+        self.text_fields = ['Notes', 'Vector_Offset_Feature_Notes', 'Slip_Offset_Feature_Notes']
+        
+        # Coordinate columns keep full float64 precision
+        self.coordinate_fields = ['_latitude', '_longitude', '_orig_lat', '_orig_lon']
+        
+        # Columns ignored when comparing observations for duplicates
+        self.system_fields = ['OBJECTID', 'GlobalID', 'CreationDate', 'EditDate', 'Editor']
+        
+        # Extension columns that reference an OBJECTID and stay integers when typed
+        self.object_id_reference_fields = ['_duplicate_of']
+        
+        # Offsets that must agree for two nearby observations to count as near-duplicates
+        self.duplicate_offset_fields = ['Horizontal_Separation_cm', 'Vertical_Separation_cm',
+                                        'Heave_cm', 'Net_Slip_Preferred_cm']
+        
+        # Text columns with at most this share of distinct values become categoricals
+        self.category_max_unique_ratio = 0.5
+        
+        # Min/pref/max triplets are discovered from the mappings; these stems name one triplet differently
+        self.triplet_aliases = {'rupture_width': 'rup_width'}
+        
+        # Allowed ranges by triplet stem token (None = unbounded); azimuth ranges may wrap through north
+        self.measurement_ranges = {
+            'az': (0, 360),
+            'dip': (0, 90),
+            'plunge': (0, 90),
+            'width': (0, None),
+            'aperture': (0, None),
+            'length': (0, None),
+        }
+        self.circular_measurements = ['az']
+        
+        # Per-row bitmask of failed measurement rules, bit i = get_measurement_rules()[i]
+        self.violation_column = '_range_violations'
+        
+        # GlobalIDs are UUIDv5 of the event and the first present source key, so remapping reproduces them
+        self.global_id_keys = ['intid', 'stnid', 'origid']
+        self.global_id_namespace = uuid.uuid5(uuid.NAMESPACE_DNS, 'scec.org')
+        
+        # Preferred/min/max columns read by the slip kinematics stage, and the columns it derives
+        self.slip_measurements = {
+            'lateral': ('Horizontal_Separation_cm', 'Horizontal_Separation_Min_cm', 'Horizontal_Separation_Max_cm'),
+            'heave': ('Heave_cm', 'Heave_min_cm', 'Heave_max_cm'),
+            'vertical': ('Vertical_Separation_cm', 'Vertical_Separation_Min_cm', 'Vertical_Separation_Max_cm'),
+            'dip': ('Local_Fault_Dip', '_fault_dip_min', '_fault_dip_max'),
+            'net': ('Net_Slip_Preferred_cm', 'Net_Slip_Min_cm', 'Net_Slip_Max_cm'),
+        }
+        self.kinematic_columns = {
+            'net': '_net_slip_cm', 'net_min': '_net_slip_min_cm', 'net_max': '_net_slip_max_cm',
+            'horizontal': '_horizontal_slip_cm', 'horizontal_min': '_horizontal_slip_min_cm',
+            'horizontal_max': '_horizontal_slip_max_cm',
+            'vertical': '_vertical_slip_cm', 'vertical_min': '_vertical_slip_min_cm',
+            'vertical_max': '_vertical_slip_max_cm',
+            'rake': '_rake_deg',
+        }
+
+    @contextmanager
+    def measure_stage(self, stage, event=None):
+        """Record wall time, rows per second and peak traced memory of a pipeline stage when instrumented"""
+        # The caller sets record['rows'] inside the block; stages must not be nested
+        record = {'stage': stage, 'event': event, 'rows': None}
+        if not self.instrument:
+            yield record
+            return
+        
+        if self.trace_memory:
+            if not tracemalloc.is_tracing():
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+            start_memory = tracemalloc.get_traced_memory()[0]
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            seconds = time.perf_counter() - start
+            record['seconds'] = round(seconds, 6)
+            record['rows_per_second'] = round(record['rows'] / seconds, 1) if record['rows'] and seconds else None
+            record['peak_mb'] = None
+            if self.trace_memory:
+                peak_memory = tracemalloc.get_traced_memory()[1]
+                record['peak_mb'] = round(max(peak_memory - start_memory, 0) / 1024 ** 2, 3)
+            
+            # Process high-water mark so far
+            record['max_rss_mb'] = self.peak_rss_mb()
+            self.stage_metrics.append(record)
 
-    def get_extended_schema_fields(self, mapping):
+    def peak_rss_mb(self):
+        """Peak resident memory of this process in MB, since it started or since reset_peak_rss()"""
+        # VmHWM belongs to this process alone; ru_maxrss is inherited from the parent across fork and exec
+        try:
+            with open('/proc/self/status') as f:
+                for line in f:
+                    if line.startswith('VmHWM:'):
+                        return round(int(line.split()[1]) / 1024, 1)
+        except OSError:
+            pass
+        # ru_maxrss is KiB on Linux
+        return round(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024, 1) if resource else None
+
+    def reset_peak_rss(self):
+        """Reset the peak reported by peak_rss_mb() to the current resident memory, where Linux allows it"""
+        try:
+            with open('/proc/self/clear_refs', 'w') as f:
+                f.write('5')
+            return True
+        except OSError:
+            return False
+
+    def write_stage_metrics(self, metrics_file):
+        """Write recorded stage metrics, with per-stage totals, as JSON"""
+        totals = {}
+        for record in self.stage_metrics:
+            total = totals.setdefault(record['stage'], {'seconds': 0.0, 'rows': 0, 'peak_mb': None, 'max_rss_mb': None})
+            total['seconds'] = round(total['seconds'] + record['seconds'], 6)
+            total['rows'] += record['rows'] or 0
+            for key in ('peak_mb', 'max_rss_mb'):
+                if record[key] is not None:
+                    total[key] = max(total[key] or 0, record[key])
+        
+        with open(metrics_file, 'w', encoding='utf-8') as f:
+            json.dump({
+                'migration_time': self.migration_time.isoformat(),
+                'stages': self.stage_metrics,
+                'totals': totals,
+            }, f, indent=2)
+        logger.info(f"Stage metrics saved to: {metrics_file}")
+        return totals
+
+    def get_extended_schema_fields(self, mapping, date_formats=None):
         """Get extended schema including new columns for unmapped fields"""
         # Start with base current schema
         extended_fields = self.current_schema_fields.copy()
         
-        # Add all new columns (those starting with _) from mapping
+        # Add all new columns (those starting with _) from mapping, plus normalized date columns
         new_columns = [field for field in mapping.values() if field and field.startswith('_')]
+        for source_field in (date_formats or {}):
+            new_columns.extend(self.date_columns(source_field))
+        new_columns.extend(self.schema_original_columns(mapping))
         new_columns = sorted(list(set(new_columns)))  # Remove duplicates and sort
         
-        # Add new columns at the end
+        # Add new columns at the end, then the measurement validation bitmask
         extended_fields.extend(new_columns)
+        extended_fields.append(self.violation_column)
         
         return extended_fields
 
-    def load_napa_data(self, file_path):
-        """Load Napa dataset"""
-        try:
-            if file_path.endswith('.csv'):
-                # Try different encodings
-                for encoding in ['utf-8', 'latin-1', 'cp1252', 'iso-8859-1']:
-                    try:
-                        df = pd.read_csv(file_path, encoding=encoding)
-                        
-                        # If only 1 column, try tab-separated
-                        if len(df.columns) == 1:
-                            df = pd.read_csv(file_path, sep='\t', encoding=encoding)
-                        
-                        logger.info(f"Successfully loaded Napa data with {encoding} encoding")
-                        break
-                    except UnicodeDecodeError:
-                        continue
-                    except Exception as e:
-                        logger.warning(f"Failed with {encoding}: {e}")
-                        continue
+    def schema_original_columns(self, mapping):
+        """Columns typed output keeps field text in for the numeric schema columns a mapping feeds"""
+        if not self.typed_schema:
+            return []
+        schema_types = self.load_schema_types()
+        numeric_types = ('esriFieldTypeSmallInteger', 'esriFieldTypeInteger', 'esriFieldTypeDouble')
+        return [f"_{field}_orig" for field in mapping.values() if schema_types.get(field) in numeric_types]
+
+    def register_event(self, name, mapping, source_label, editor=None, source_file=None,
+                       date_formats=None, timezone='UTC', metadata_file=None, **read_options):
+        """Register an earthquake event with its mapping, Notes source tag, date formats and loader options"""
+        # date_formats maps source date fields to strptime formats; timezone applies to values without an offset
+        # metadata_file is the event's FGDC XML describing source attributes and their domains
+        self.events[name] = {
+            'mapping': mapping,
+            'source_label': source_label,
+            'editor': editor or f"{name}_Migration",
+            'source_file': source_file,
+            'date_formats': date_formats or {},
+            'timezone': timezone,
+            'metadata_file': metadata_file,
+            'read_options': read_options,
+        }
+
+    def set_event_source(self, name, source_file, **read_options):
+        """Set the source file (and optional loader options) for a registered event"""
+        self.events[name]['source_file'] = source_file
+        self.events[name]['read_options'].update(read_options)
+
+    def detect_text_format(self, file_path, sample_size=65536, block_size=1 << 20):
+        """Detect encoding and delimiter of a delimited text file without parsing it"""
+        with open(file_path, 'rb') as f:
+            sample = f.read(sample_size)
+            
+            # Byte order marks are unambiguous
+            if sample.startswith(codecs.BOM_UTF8):
+                encoding = 'utf-8-sig'
+            elif sample.startswith((codecs.BOM_UTF16_LE, codecs.BOM_UTF16_BE)):
+                encoding = 'utf-16'
             else:
-                df = pd.read_excel(file_path)
-                
-            logger.info(f"Loaded Napa data: {len(df)} records, {len(df.columns)} columns")
-            return df
-        except Exception as e:
-            logger.error(f"Error loading Napa data: {e}")
-            return None
+                # Validate UTF-8 block by block; latin-1 decodes any byte, as the old fallback did
+                encoding = 'utf-8'
+                decoder = codecs.getincrementaldecoder('utf-8')()
+                block = sample
+                try:
+                    while block:
+                        decoder.decode(block)
+                        block = f.read(block_size)
+                    decoder.decode(b'', final=True)
+                except UnicodeDecodeError:
+                    encoding = 'latin-1'
+        
+        # The header line decides the delimiter
+        header = sample.decode(encoding, errors='replace').splitlines()[0] if sample else ''
+        sep = max([',', '\t', ';', '|'], key=header.count)
+        return encoding, sep
 
-    def load_ridgecrest_data(self, file_path):
-        """Load Ridgecrest dataset"""
+    def load_source_data(self, file_path, dataset_name, **read_options):
+        """Load a dataset from delimited text or Excel, parsing the file once"""
         try:
-            if file_path.endswith('.csv'):
-                df = pd.read_csv(file_path)
+            if file_path.lower().endswith(('.csv', '.txt', '.tsv')):
+                if 'sep' not in read_options or 'encoding' not in read_options:
+                    encoding, sep = self.detect_text_format(file_path)
+                    read_options = {'sep': sep, 'encoding': encoding, **read_options}
+                    logger.info(f"Detected {dataset_name} format: encoding={read_options['encoding']}, "
+                                f"delimiter={read_options['sep']!r}")
+                df = pd.read_csv(file_path, **read_options)
             else:
-                df = pd.read_excel(file_path)
-            logger.info(f"Loaded Ridgecrest data: {len(df)} records, {len(df.columns)} columns")
+                df = self.load_cached_source(file_path) if self.use_source_cache else None
+                if df is None:
+                    df = pd.read_excel(file_path, **read_options)
+                    if self.use_source_cache:
+                        self.store_cached_source(file_path, df)
+            
+            logger.info(f"Loaded {dataset_name} data: {len(df)} records, {len(df.columns)} columns")
             return df
         except Exception as e:
-            logger.error(f"Error loading Ridgecrest data: {e}")
+            logger.error(f"Error loading {dataset_name} data: {e}")
             return None
 
-    def map_napa_to_current(self, napa_df):
-        """Map Napa dataset to current schema"""
-        logger.info("Mapping Napa data to current schema...")
+    def source_cache_path(self, file_path):
+        """Get the sidecar cache path prefix for a source file"""
+        file_path = os.path.abspath(file_path)
+        cache_dir = self.cache_dir or os.path.join(os.path.dirname(file_path), '.source_cache')
+        path_key = hashlib.sha1(file_path.encode('utf-8')).hexdigest()[:12]
+        return os.path.join(cache_dir, f"{os.path.basename(file_path)}.{path_key}")
+
+    def load_cached_source(self, file_path):
+        """Load a previously parsed source from its sidecar cache, or None if missing or stale"""
+        cache_prefix = self.source_cache_path(file_path)
+        try:
+            with open(cache_prefix + '.json', encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
         
-        # Get extended schema including new columns
-        extended_fields = self.get_extended_schema_fields(self.napa_mapping)
-        current_df = pd.DataFrame(columns=extended_fields)
+        # Size and mtime are a fast check; the content hash decides when they differ
+        stat = os.stat(file_path)
+        if entry['size'] != stat.st_size or entry['mtime_ns'] != stat.st_mtime_ns:
+            if entry['size'] != stat.st_size or entry['sha256'] != file_content_hash(file_path):
+                logger.info(f"Source changed, evicting cache entry for {file_path}")
+                self.evict_cached_source(file_path)
+                return None
+            entry['mtime_ns'] = stat.st_mtime_ns
+            with open(cache_prefix + '.json', 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
         
-        for idx, row in napa_df.iterrows():
-            mapped_row = {}
-            
-            # Generate OBJECTID (auto-incrementing)
-            mapped_row['OBJECTID'] = idx + 1
-            
-            # Apply ALL mappings (both direct and new columns)
-            for napa_field, current_field in self.napa_mapping.items():
-                if current_field and napa_field in row:
-                    mapped_row[current_field] = row[napa_field]
+        data_path = cache_prefix + '.' + entry['format']
+        try:
+            df = pd.read_feather(data_path) if entry['format'] == 'feather' else pd.read_pickle(data_path)
+        except Exception as e:
+            logger.warning(f"Unreadable cache entry for {file_path}: {e}")
+            self.evict_cached_source(file_path)
+            return None
+        
+        logger.info(f"Loaded {file_path} from source cache")
+        return df
+
+    def store_cached_source(self, file_path, df):
+        """Store a parsed source in its sidecar cache"""
+        cache_prefix = self.source_cache_path(file_path)
+        try:
+            os.makedirs(os.path.dirname(cache_prefix), exist_ok=True)
+            self.evict_cached_source(file_path)
             
-            # Set default values for system fields
-            mapped_row['CreationDate'] = datetime.now()
-            mapped_row['EditDate'] = datetime.now()
-            mapped_row['Editor'] = 'Napa_Migration'
+            # Feather when Arrow can hold the columns; Excel often yields mixed-type columns that need pickle
+            try:
+                if pa is None:
+                    raise ImportError("pyarrow is not installed")
+                df.to_feather(cache_prefix + '.feather')
+                data_format = 'feather'
+            except Exception:
+                if os.path.exists(cache_prefix + '.feather'):
+                    os.remove(cache_prefix + '.feather')
+                df.to_pickle(cache_prefix + '.pkl')
+                data_format = 'pkl'
             
-            # Add dataset source identifier to Notes
-            existing_notes = mapped_row.get('Notes', '')
-            if existing_notes:
-                mapped_row['Notes'] = f"Source: Napa 2014; {existing_notes}"
-            else:
-                mapped_row['Notes'] = "Source: Napa 2014"
+            stat = os.stat(file_path)
+            entry = {
+                'path': os.path.abspath(file_path),
+                'size': stat.st_size,
+                'mtime_ns': stat.st_mtime_ns,
+                'sha256': file_content_hash(file_path),
+                'format': data_format,
+            }
+            with open(cache_prefix + '.json', 'w', encoding='utf-8') as f:
+                json.dump(entry, f)
+            logger.info(f"Cached parsed {file_path} as {data_format}")
+        except OSError as e:
+            logger.warning(f"Could not cache {file_path}: {e}")
+
+    def evict_cached_source(self, file_path):
+        """Remove the sidecar cache entry for a source file"""
+        cache_prefix = self.source_cache_path(file_path)
+        for suffix in ('.json', '.feather', '.pkl'):
+            if os.path.exists(cache_prefix + suffix):
+                os.remove(cache_prefix + suffix)
+
+    def resolve_source(self, file_path):
+        """Local path for a source: URLs are fetched through the cache and ZIP archives are extracted"""
+        try:
+            if file_path.lower().startswith(('http://', 'https://')):
+                file_path = self.fetcher.fetch(file_path)
+            if file_path.lower().endswith('.zip'):
+                file_path = self.fetcher.extract_member(file_path, '.csv')
+        except (FetchError, OSError) as e:
+            logger.error(f"Error fetching {file_path}: {e}")
+            return None
+        return file_path
+
+    def use_sciencebase_sources(self, names=None, max_age=0):
+        """Point registered events at their ScienceBase release files, downloading only what changed"""
+        for name in names or self.sciencebase_files:
+            data_file, metadata_file = self.sciencebase_files[name]
+            item_id = SCIENCEBASE_ITEMS[name]
+            try:
+                files = self.fetcher.sciencebase_files(item_id, max_age)
+                source_path = self.fetcher.fetch_sciencebase_file(item_id, data_file, max_age, files)
+                metadata_path = self.fetcher.fetch_sciencebase_file(item_id, metadata_file, max_age, files)
+            except FetchError as e:
+                logger.error(f"Could not fetch {name} from ScienceBase: {e}")
+                continue
             
-            # Append to dataframe
-            current_df = pd.concat([current_df, pd.DataFrame([mapped_row])], ignore_index=True)
+            self.set_event_source(name, source_path)
+            self.events[name]['metadata_file'] = metadata_path
+            self.event_metadata.pop(name, None)
+            self.metadata_types = None
+            logger.info(f"{name} sources set from ScienceBase item {item_id}")
+
+    def load_event(self, name, file_path=None):
+        """Load the source dataset of a registered event"""
+        event = self.events[name]
+        file_path = self.resolve_source(file_path or event['source_file'])
+        if file_path is None:
+            return None
+        return self.load_source_data(file_path, name, **event['read_options'])
+
+    def load_event_metadata(self, name):
+        """Load the compiled FGDC attribute schema of a registered event, or None if it has none"""
+        if name not in self.event_metadata:
+            metadata_file = self.events[name]['metadata_file']
+            if metadata_file:
+                metadata_file = self.resolve_source(metadata_file)
+            schema = None
+            if metadata_file and os.path.exists(metadata_file):
+                try:
+                    schema = AttributeSchema.load(metadata_file, self.source_cache_path(metadata_file) + '.schema.json')
+                except Exception as e:
+                    logger.error(f"Error reading metadata for {name}: {e}")
+            elif metadata_file:
+                logger.warning(f"Metadata file not found for {name}: {metadata_file}")
+            self.event_metadata[name] = schema
+        return self.event_metadata[name]
+
+    def validate_event_domains(self, name, source_df):
+        """Check source values against the attribute domains declared in the event's metadata"""
+        schema = self.load_event_metadata(name)
+        if schema is None:
+            return None
+        
+        missing = [col for col in source_df.columns if col not in schema]
+        if missing:
+            logger.warning(f"{name}: {len(missing)} columns are not described in the metadata: {', '.join(missing)}")
+        violations = schema.validate(source_df)
+        for col, violation in violations.items():
+            logger.warning(f"{name} {col}: {violation['invalid']} values outside the declared domain "
+                           f"(e.g. {', '.join(violation['examples'])})")
+        return violations
+
+    def get_metadata_types(self):
+        """Extension column types implied by the metadata domains, where all events describing a column agree"""
+        if self.metadata_types is None:
+            column_types = {}
+            for name, event in self.events.items():
+                schema = self.load_event_metadata(name)
+                for source_field, current_field in event['mapping'].items():
+                    if not current_field or not current_field.startswith('_'):
+                        continue
+                    if schema is None or source_field not in schema:
+                        column_types.setdefault(current_field, set()).add(None)
+                    elif schema.categories(source_field) is not None:
+                        column_types.setdefault(current_field, set()).add('category')
+                    elif schema.is_numeric_range(source_field):
+                        column_types.setdefault(current_field, set()).add('numeric')
+                    else:
+                        column_types.setdefault(current_field, set()).add(None)
+            self.metadata_types = {col: types.pop() for col, types in column_types.items()
+                                   if len(types) == 1 and None not in types}
+        return self.metadata_types
+
+    def draft_mapping(self, name):
+        """Draft a mapping for a new event from its metadata, reusing targets of known source fields"""
+        schema = self.load_event_metadata(name)
+        if schema is None:
+            return None
+        
+        known_targets = {}
+        for event in self.events.values():
+            for source_field, current_field in event['mapping'].items():
+                known_targets.setdefault(source_field, current_field)
+        return {label: known_targets.get(label, f"_{label}") for label in schema.attributes}
+
+    def load_napa_data(self, file_path):
+        """Load Napa dataset"""
+        return self.load_event('Napa', file_path)
+
+    def load_ridgecrest_data(self, file_path):
+        """Load Ridgecrest dataset"""
+        return self.load_event('Ridgecrest', file_path)
+
+    def map_to_current(self, source_df, mapping, source_label, editor, objectid_start=1,
+                       date_formats=None, timezone='UTC'):
+        """Map a source dataset to current schema using column operations"""
+        # Get extended schema including new columns
+        extended_fields = self.get_extended_schema_fields(mapping, date_formats)
+        current_df = pd.DataFrame(index=pd.RangeIndex(len(source_df)), columns=extended_fields)
+        
+        # Generate OBJECTID (auto-incrementing)
+        current_df['OBJECTID'] = np.arange(objectid_start, objectid_start + len(source_df))
         
-        logger.info(f"Mapped {len(current_df)} Napa records to extended current schema")
+        # Stable record identity across runs, independent of OBJECTID numbering
+        current_df['GlobalID'] = self.global_ids(source_df, source_label)
+        
+        # Apply ALL mappings (both direct and new columns) as whole-column copies
+        mapped_fields = set()
+        for source_field, current_field in mapping.items():
+            if current_field and source_field in source_df.columns:
+                current_df[current_field] = source_df[source_field].to_numpy()
+                mapped_fields.add(current_field)
+        
+        # Normalize declared date fields to UTC timestamps, keeping the original strings
+        for source_field, date_format in (date_formats or {}).items():
+            if source_field in source_df.columns:
+                parsed_column, original_column = self.date_columns(source_field)
+                current_df[original_column] = self.date_text(source_df[source_field]).to_numpy()
+                current_df[parsed_column] = self.parse_dates(source_df[source_field], date_format, timezone,
+                                                             f"{source_label} {source_field}").to_numpy()
+        
+        # Flag rows whose measurement triplets break range or ordering rules
+        current_df[self.violation_column] = self.validate_measurements(current_df)
+        
+        # Set default values for system fields
+        current_df['CreationDate'] = self.migration_time
+        current_df['EditDate'] = self.migration_time
+        current_df['Editor'] = editor
+        
+        # Add dataset source identifier to Notes (truthiness matches the original per-row check)
+        prefix = f"Source: {source_label}"
+        notes = pd.Series(prefix, index=current_df.index, dtype=object)
+        if 'Notes' in mapped_fields:
+            existing_notes = current_df['Notes'].astype(object)
+            has_notes = existing_notes.astype(bool).to_numpy()
+            notes[has_notes] = prefix + '; ' + existing_notes[has_notes].map(str)
+        current_df['Notes'] = notes
+        
+        return current_df
+
+    def source_key_text(self, series):
+        """Source key values as text, writing whole-number floats without '.0' (None when missing)"""
+        text = series.astype('string').str.strip()
+        numeric = pd.to_numeric(series, errors='coerce')
+        integral = (numeric.notna() & (numeric % 1 == 0)).to_numpy()
+        text[integral] = numeric[integral].astype('int64').astype(str).to_numpy()
+        text = text.astype(object)
+        return text.where(text.notna() & (text != ''), None)
+
+    def global_ids(self, source_df, source_label):
+        """Deterministic esri-style GlobalIDs from the event and each record's source key"""
+        keys = pd.Series(None, index=source_df.index, dtype=object)
+        for key in reversed(self.global_id_keys):
+            if key in source_df.columns:
+                values = self.source_key_text(source_df[key])
+                keys = (key + '=' + values).where(values.notna(), keys)
+        
+        # Records without any source key are identified by their content
+        missing = keys.isna().to_numpy()
+        if missing.any():
+            logger.warning(f"{source_label}: {int(missing.sum())} records without a source key, hashing their values")
+            row_hash = pd.util.hash_pandas_object(source_df[missing].astype(str), index=False)
+            keys[missing] = ('row=' + row_hash.astype(str)).to_numpy()
+        
+        # Reused keys are numbered in order of appearance
+        occurrence = keys.groupby(keys.to_numpy()).cumcount()
+        keys = keys.where(occurrence == 0, keys + '#' + occurrence.astype(str))
+        
+        namespace = self.global_id_namespace
+        return ['{' + str(uuid.uuid5(namespace, f"{source_label}|{key}")).upper() + '}' for key in keys]
+
+    def map_event(self, name, source_df):
+        """Map a registered event's dataset to current schema"""
+        logger.info(f"Mapping {name} data to current schema...")
+        
+        event = self.events[name]
+        current_df = self.map_to_current(source_df, event['mapping'], event['source_label'], event['editor'],
+                                         date_formats=event['date_formats'], timezone=event['timezone'])
+        
+        logger.info(f"Mapped {len(current_df)} {name} records to extended current schema")
         return current_df
 
+    def map_napa_to_current(self, napa_df):
+        """Map Napa dataset to current schema"""
+        return self.map_event('Napa', napa_df)
+
     def map_ridgecrest_to_current(self, ridgecrest_df):
         """Map Ridgecrest dataset to current schema"""
-        logger.info("Mapping Ridgecrest data to current schema...")
+        return self.map_event('Ridgecrest', ridgecrest_df)
+
+    def get_measurement_triplets(self):
+        """Discover min/pref/max measurement triplets in the registered mappings, as current schema columns"""
+        triplets = {}
+        for event in self.events.values():
+            for source_field, current_field in event['mapping'].items():
+                stem, _, part = source_field.rpartition('_')
+                if current_field and stem and part in ('min', 'pref', 'max'):
+                    stem = self.triplet_aliases.get(stem, stem)
+                    triplets.setdefault(stem, {}).setdefault(part, current_field)
+        return {stem: parts for stem, parts in triplets.items() if 'min' in parts and 'max' in parts}
+
+    def get_measurement_rules(self):
+        """Ordering and range rules for every triplet; list position is the rule's bit in the violation mask"""
+        rules = []
+        for stem, parts in self.get_measurement_triplets().items():
+            columns = [parts[part] for part in ('min', 'pref', 'max') if part in parts]
+            tokens = stem.split('_')
+            circular = any(token in tokens for token in self.circular_measurements)
+            rules.append({'name': f"{stem} min <= pref <= max", 'kind': 'order',
+                          'columns': columns, 'circular': circular})
+            
+            bounds = next((bounds for token, bounds in self.measurement_ranges.items() if token in tokens), None)
+            if bounds:
+                low, high = bounds
+                name = f"{stem} in {low}-{high}" if high is not None else f"{stem} >= {low}"
+                rules.append({'name': name, 'kind': 'range', 'columns': columns, 'bounds': bounds})
+        return rules
+
+    def numeric_values(self, series):
+        """Column as a float64 array, converting each distinct value once; non-numbers become NaN"""
+        if pd.api.types.is_float_dtype(series) or pd.api.types.is_integer_dtype(series):
+            return series.to_numpy(dtype=np.float64, na_value=np.nan)
+        if isinstance(series.dtype, pd.CategoricalDtype):
+            codes, uniques = series.cat.codes.to_numpy(), series.cat.categories
+            lookup = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+            return np.append(lookup, np.nan)[codes]
         
-        # Get extended schema including new columns
-        extended_fields = self.get_extended_schema_fields(self.ridgecrest_mapping)
-        current_df = pd.DataFrame(columns=extended_fields)
+        # Finalized columns are mostly '' fills, so only the filled entries are factorized
+        values = series.to_numpy(dtype=object)
+        try:
+            filled = values != ''
+        except TypeError:  # pd.NA has no truth value; factorize everything
+            filled = np.ones(len(values), dtype=bool)
+        result = np.full(len(values), np.nan)
+        codes, uniques = pd.factorize(values[filled])
+        lookup = pd.to_numeric(pd.Series(uniques, dtype=object), errors='coerce').to_numpy(dtype=np.float64)
+        result[filled] = np.append(lookup, np.nan)[codes]
+        return result
+
+    def validate_measurements(self, df, rules=None):
+        """Evaluate measurement rules as whole-column masks and pack the failures into a per-row bitmask"""
+        rules = rules if rules is not None else self.get_measurement_rules()
+        mask = np.zeros(len(df), dtype=np.uint32 if len(rules) <= 32 else np.uint64)
         
-        for idx, row in ridgecrest_df.iterrows():
-            mapped_row = {}
-            
-            # Generate OBJECTID (auto-incrementing, offset to avoid conflicts with Napa)
-            mapped_row['OBJECTID'] = idx + 1
-            
-            # Apply ALL mappings (both direct and new columns)
-            for ridgecrest_field, current_field in self.ridgecrest_mapping.items():
-                if current_field and ridgecrest_field in row:
-                    mapped_row[current_field] = row[ridgecrest_field]
-            
-            # Set default values for system fields
-            mapped_row['CreationDate'] = datetime.now()
-            mapped_row['EditDate'] = datetime.now() 
-            mapped_row['Editor'] = 'Ridgecrest_Migration'
+        # Convert each column once; text such as '>10.5' is not a number and is not checked
+        numeric = {}
+        def values(col):
+            if col not in numeric:
+                numeric[col] = self.numeric_values(df[col]) if col in df.columns else np.full(len(df), np.nan)
+            return numeric[col]
+        
+        with np.errstate(invalid='ignore'):
+            for bit, rule in enumerate(rules):
+                columns = [values(col) for col in rule['columns']]
+                failed = np.zeros(len(df), dtype=bool)
+                if rule['kind'] == 'order' and rule['circular']:
+                    # Pref must lie on the clockwise arc from min to max
+                    low, high = columns[0], columns[-1]
+                    span = np.mod(high - low, 360)
+                    for middle in columns[1:-1]:
+                        failed |= np.mod(middle - low, 360) > span
+                elif rule['kind'] == 'order':
+                    for lower, upper in zip(columns, columns[1:]):
+                        failed |= lower > upper
+                    failed |= columns[0] > columns[-1]
+                else:
+                    low, high = rule['bounds']
+                    for column in columns:
+                        failed |= column < low
+                        if high is not None:
+                            failed |= column > high
+                mask[failed] |= mask.dtype.type(1 << bit)
+        return mask
+
+    def summarize_measurement_violations(self, df):
+        """Count rows failing each measurement rule from the violation bitmask"""
+        if self.violation_column not in df.columns:
+            return None
+        mask = pd.to_numeric(df[self.violation_column], errors='coerce').fillna(0).to_numpy(dtype=np.uint64)
+        summary = {'rows': int((mask != 0).sum()), 'rules': {}}
+        for bit, rule in enumerate(self.get_measurement_rules()):
+            count = int(((mask >> np.uint64(bit)) & np.uint64(1)).sum())
+            if count:
+                summary['rules'][rule['name']] = count
+        return summary
+
+    def date_columns(self, source_field):
+        """Names of the normalized and original-value extension columns for a source date field"""
+        return f"_{source_field}", f"_{source_field}_orig"
+
+    def date_value_text(self, value):
+        """Text of a date cell that a spreadsheet reader did not return as a string or date"""
+        if isinstance(value, (str, datetime, np.datetime64)):
+            return value
+        if isinstance(value, timedelta):
+            # Excel reads 'YYYY:MM:DD' as an [h]:mm:ss duration; write it back as the text it showed
+            seconds = int(value.total_seconds())
+            return f"{seconds // 3600}:{seconds // 60 % 60:02d}:{seconds % 60:02d}"
+        if isinstance(value, (int, float, np.number)) and float(value).is_integer():
+            return str(int(value))
+        return str(value)
+
+    def date_text(self, values):
+        """Date values as strings or dates, converting each distinct value once (None when missing)"""
+        codes, uniques = pd.factorize(values.astype(object))
+        text = pd.Series(uniques, dtype=object).map(self.date_value_text).to_numpy(dtype=object)
+        return pd.Series(np.append(text, None)[codes], index=values.index, dtype=object)
+
+    def parse_dates(self, values, date_format, timezone='UTC', label='dates'):
+        """Parse a column of date strings to UTC timestamps, parsing each distinct value only once"""
+        text = self.date_text(values)
+        cache_key = (date_format, timezone)
+        parsed = self.parsed_dates.get(cache_key)
+        if parsed is None:
+            parsed = pd.Series(dtype='datetime64[ns, UTC]')
+        
+        # Parse only values not seen before, as one vectorized call
+        new_values = pd.Index(text.dropna().unique(), dtype=object).difference(parsed.index)
+        if len(new_values):
+            new_values = pd.Series(new_values, index=new_values, dtype=object)
+            is_text = new_values.map(lambda value: isinstance(value, str)).to_numpy(dtype=bool)
             
-            # Add dataset source identifier to Notes
-            existing_notes = mapped_row.get('Notes', '')
-            if existing_notes:
-                mapped_row['Notes'] = f"Source: Ridgecrest 2019; {existing_notes}"
-            else:
-                mapped_row['Notes'] = "Source: Ridgecrest 2019"
+            # Values with their own UTC offset may mix offsets (PST/PDT), so they are converted directly
+            new_parsed = pd.to_datetime(new_values[is_text].str.strip(), format=date_format, errors='coerce',
+                                        utc='%z' in date_format)
             
-            # Append to dataframe
-            current_df = pd.concat([current_df, pd.DataFrame([mapped_row])], ignore_index=True)
+            # Spreadsheet cells that already hold dates are taken in the event's timezone, like text without an offset
+            new_parsed = pd.concat([self.dates_to_utc(new_parsed, timezone),
+                                    self.dates_to_utc(pd.to_datetime(new_values[~is_text], errors='coerce'), timezone)])
+            parsed = pd.concat([parsed, new_parsed]) if len(parsed) else new_parsed
+            self.parsed_dates[cache_key] = parsed
         
-        logger.info(f"Mapped {len(current_df)} Ridgecrest records to extended current schema")
-        return current_df
+        result = text.map(parsed).astype('datetime64[ns, UTC]')
+        
+        # Report values present in the source that did not match the declared format
+        unparsed = text.notna() & result.isna()
+        if unparsed.any():
+            examples = ', '.join(repr(value) for value in text[unparsed].unique()[:5])
+            logger.warning(f"{label}: {int(unparsed.sum())} values do not match '{date_format}' (e.g. {examples})")
+        return result
 
-    def consolidate_datasets(self, napa_current_df, ridgecrest_current_df):
-        """Consolidate mapped datasets into single current schema dataset"""
-        logger.info("Consolidating datasets...")
+    def dates_to_utc(self, dates, timezone):
+        """Localize naive parsed dates to the event's timezone (nonexistent or ambiguous times become NaT) and convert to UTC"""
+        if dates.dt.tz is None:
+            dates = dates.dt.tz_localize(timezone, ambiguous='NaT', nonexistent='NaT')
+        return dates.dt.tz_convert('UTC').astype('datetime64[ns, UTC]')
+
+    def select_time_window(self, df, start=None, end=None, date_column='_obs_date'):
+        """Select observations with start <= date < end; naive bounds are taken as UTC"""
+        def to_utc(bound):
+            bound = pd.Timestamp(bound)
+            return bound.tz_localize('UTC') if bound.tz is None else bound.tz_convert('UTC')
         
-        # Get all unique columns from both datasets
-        all_columns = list(set(napa_current_df.columns.tolist() + ridgecrest_current_df.columns.tolist()))
-        all_columns = sorted(all_columns)  # Sort for consistency
+        dates = df[date_column]
+        mask = dates.notna()
+        if start is not None:
+            mask &= dates >= to_utc(start)
+        if end is not None:
+            mask &= dates < to_utc(end)
+        return df[mask]
+
+    def summarize_dates(self, df):
+        """Summarize normalized date columns: parsed, unparseable and covered range"""
+        summary = {}
+        for col in df.columns:
+            if not (col.startswith('_') and col + '_orig' in df.columns):
+                continue
+            dates = pd.to_datetime(df[col], errors='coerce', utc=True)
+            original = df[col + '_orig'].astype(object)
+            present = original.notna() & (original.astype(str).str.strip() != '')
+            summary[col] = {
+                'parsed': int(dates.notna().sum()),
+                'unparsed': int((present & dates.isna()).sum()),
+                'unparsed_examples': original[present & dates.isna()].astype(str).unique()[:5].tolist(),
+                'start': dates.min(),
+                'end': dates.max(),
+            }
+        return summary
+
+    def process_event(self, name):
+        """Load, map and finalize one registered event"""
+        first_metric = len(self.stage_metrics)
+        with self.measure_stage('load', name) as stage:
+            source_df = self.load_event(name)
+            stage['rows'] = len(source_df) if source_df is not None else 0
+        if source_df is None:
+            return None
         
-        # Ensure both dataframes have the same columns (fill missing with NaN)
-        for col in all_columns:
-            if col not in napa_current_df.columns:
-                napa_current_df[col] = np.nan
-            if col not in ridgecrest_current_df.columns:
-                ridgecrest_current_df[col] = np.nan
+        with self.measure_stage('map', name) as stage:
+            current_df = self.map_event(name, source_df)
+            stage['rows'] = len(current_df)
+        result = {
+            'name': name,
+            'input_records': len(source_df),
+            'input_fields': len(source_df.columns),
+            'domain_violations': self.validate_event_domains(name, source_df),
+            'memory_usage': self.memory_usage_comparison(current_df) if self.typed_schema else None,
+        }
+        with self.measure_stage('finalize', name) as stage:
+            result['current'] = self.finalize_single_dataset(current_df)
+            stage['rows'] = len(current_df)
         
-        # Reorder columns
-        napa_current_df = napa_current_df[all_columns]
-        ridgecrest_current_df = ridgecrest_current_df[all_columns]
+        # Worker processes hand their metrics back with the result
+        result['stage_metrics'] = self.stage_metrics[first_metric:]
+        return result
+
+    def run_pipeline(self, names=None, processes=None):
+        """Load and map registered events, in parallel across a process pool when there are several"""
+        names = [name for name in (self.events if names is None else names) if self.events[name]['source_file']]
+        if processes == 1 or len(names) < 2:
+            results = [self.process_event(name) for name in names]
+        else:
+            with ProcessPoolExecutor(max_workers=processes) as executor:
+                results = list(executor.map(self.process_event, names))
+            self.stage_metrics.extend(metric for result in results if result for metric in result['stage_metrics'])
         
-        # Combine datasets
-        consolidated_df = pd.concat([napa_current_df, ridgecrest_current_df], ignore_index=True)
+        for name, result in zip(names, results):
+            if result is None:
+                logger.warning(f"Failed to load {name} data - proceeding without it")
+        return {result['name']: result for result in results if result is not None}
+
+    def consolidate_datasets(self, napa_current_df, ridgecrest_current_df, deduplicate=False):
+        """Consolidate mapped datasets into single current schema dataset"""
+        return self.consolidate_events([napa_current_df, ridgecrest_current_df], deduplicate)
+
+    def consolidate_events(self, current_frames, deduplicate=False):
+        """Consolidate any number of mapped datasets with one aligned concat"""
+        logger.info("Consolidating datasets...")
+        with self.measure_stage('consolidate') as stage:
+            consolidated_df = self.concat_events(current_frames, deduplicate)
+            stage['rows'] = len(consolidated_df)
+        return consolidated_df
+
+    def concat_events(self, current_frames, deduplicate=False):
+        """Align, concatenate, optionally deduplicate and finalize mapped datasets"""
+        # Get all unique columns across datasets, sorted for consistency
+        all_columns = sorted(set().union(*(df.columns for df in current_frames)))
+        
+        # Combine datasets; columns missing from a dataset are filled with NaN
+        consolidated_df = pd.concat(current_frames, ignore_index=True, sort=False)[all_columns]
         
         # Reset OBJECTID to be sequential
         consolidated_df['OBJECTID'] = range(1, len(consolidated_df) + 1)
         
+        # Each event's _range_violations mask is kept rather than re-validated; rule bits are
+        # numbered from the triplets of every registered event, so they agree across events
+        
+        # Flag exact and near-duplicate observations (optional)
+        if deduplicate:
+            consolidated_df = self.flag_duplicates(consolidated_df)
+        
+        # Net slip, rake and slip components across all events
+        consolidated_df = self.derive_kinematics(consolidated_df)
+        
         # Fill NaN values appropriately
-        for col in consolidated_df.columns:
-            if col in ['Notes', 'Vector_Offset_Feature_Notes', 'Slip_Offset_Feature_Notes'] or col.startswith('_'):
-                consolidated_df[col] = consolidated_df[col].fillna('')
-            elif consolidated_df[col].dtype == 'object':
-                consolidated_df[col] = consolidated_df[col].fillna('')
-            else:
-                consolidated_df[col] = consolidated_df[col].fillna(np.nan)
+        consolidated_df = self.finalize_single_dataset(consolidated_df)
         
-        logger.info(f"Consolidated dataset: {len(consolidated_df)} total records with {len(all_columns)} columns")
+        logger.info(f"Consolidated dataset: {len(consolidated_df)} total records with {len(consolidated_df.columns)} columns")
         return consolidated_df
 
+    def flag_duplicates(self, df, distance_tolerance_m=1.0, offset_tolerance_cm=0.5):
+        """Flag exact and near-duplicate observations with _duplicate_of and _duplicate_type"""
+        object_ids = df['OBJECTID'].to_numpy()
+        duplicate_of = pd.Series(None, index=df.index, dtype=object)
+        duplicate_type = pd.Series('', index=df.index, dtype=object)
+        
+        # Exact duplicates: identical hash over every non-system column
+        compare_columns = [col for col in df.columns if col not in self.system_fields]
+        row_hash = pd.util.hash_pandas_object(df[compare_columns].astype(str), index=False)
+        first_id = pd.Series(object_ids, index=df.index).groupby(row_hash.to_numpy()).transform('first')
+        exact = row_hash.duplicated(keep='first').to_numpy()
+        duplicate_of[exact] = first_id[exact].astype(object)
+        duplicate_type[exact] = 'exact'
+        
+        # Near duplicates: block by coordinate cell and date, then compare distance and offsets
+        pairs = self.near_duplicate_pairs(df.loc[~exact], distance_tolerance_m, offset_tolerance_cm)
+        if len(pairs):
+            near = pairs.groupby('right')['left_id'].min()
+            duplicate_of[near.index] = near.astype(object).to_numpy()
+            duplicate_type[near.index] = 'near'
+        
+        df['_duplicate_of'] = duplicate_of
+        df['_duplicate_type'] = duplicate_type
+        logger.info(f"Duplicate check: {int(exact.sum())} exact, {len(pairs) and len(near)} near duplicates flagged")
+        return df
+
+    def near_duplicate_pairs(self, df, distance_tolerance_m, offset_tolerance_cm):
+        """Find candidate near-duplicate pairs by coordinate cell and observation day, without comparing every pair"""
+        lat = pd.to_numeric(df.get('_latitude'), errors='coerce')
+        lon = pd.to_numeric(df.get('_longitude'), errors='coerce')
+        located = lat.notna() & lon.notna()
+        if not located.any():
+            return pd.DataFrame(columns=['left', 'right', 'left_id'])
+        
+        # Cells at least distance_tolerance_m wide, so matches lie in the same or an adjacent cell
+        cell_lat = distance_tolerance_m / 111320
+        cell_lon = cell_lat / max(np.cos(np.radians(lat[located].abs().max())), 1e-6)
+        # Same UTC day of the normalized observation date, or the same Date_of_Movement text without one
+        dates = pd.Series('', index=df.index, dtype=object)
+        if 'Date_of_Movement' in df.columns:
+            dates = df['Date_of_Movement'].astype(object).where(df['Date_of_Movement'].notna(), '').astype(str)
+        if '_obs_date' in df.columns:
+            days = pd.to_datetime(df['_obs_date'], utc=True, errors='coerce').dt.strftime('%Y-%m-%d')
+            dates = days.astype(object).where(days.notna(), dates)
+        blocks = pd.DataFrame({
+            'row': np.floor(lat[located] / cell_lat).astype(np.int64),
+            'col': np.floor(lon[located] / cell_lon).astype(np.int64),
+            'date': dates[located],
+            'pos': df.index[located],
+        })
+        
+        # Join each record to records in its own and the eight neighbouring cells
+        neighbours = []
+        for d_row in (-1, 0, 1):
+            for d_col in (-1, 0, 1):
+                shifted = blocks.assign(row=blocks['row'] + d_row, col=blocks['col'] + d_col)
+                neighbours.append(blocks.merge(shifted, on=['row', 'col', 'date'], suffixes=('_l', '_r')))
+        pairs = pd.concat(neighbours, ignore_index=True)
+        pairs = pairs[pairs['pos_l'] < pairs['pos_r']].drop_duplicates(['pos_l', 'pos_r'])
+        left, right = pairs['pos_l'].to_numpy(), pairs['pos_r'].to_numpy()
+        
+        # Same point within tolerance
+        lat_l, lat_r = np.radians(lat[left].to_numpy()), np.radians(lat[right].to_numpy())
+        dlon = np.radians(lon[right].to_numpy() - lon[left].to_numpy())
+        a = np.sin((lat_r - lat_l) / 2) ** 2 + np.cos(lat_l) * np.cos(lat_r) * np.sin(dlon / 2) ** 2
+        keep = 2 * 6371008.8 * np.arcsin(np.sqrt(np.clip(a, 0, 1))) <= distance_tolerance_m
+        
+        # Same offsets: numerically close, or identical text when not numeric
+        for col in self.duplicate_offset_fields:
+            if col not in df.columns:
+                continue
+            values = df[col].astype(object).where(df[col].notna(), '')
+            numeric = pd.to_numeric(values, errors='coerce')
+            num_l, num_r = numeric[left].to_numpy(), numeric[right].to_numpy()
+            text_l, text_r = values[left].astype(str).to_numpy(), values[right].astype(str).to_numpy()
+            close = np.abs(num_l - num_r) <= offset_tolerance_cm
+            keep &= np.where(np.isnan(num_l) | np.isnan(num_r), text_l == text_r, close)
+        
+        left, right = left[keep], right[keep]
+        return pd.DataFrame({'left': left, 'right': right, 'left_id': df.loc[left, 'OBJECTID'].to_numpy()})
+
+    def summarize_duplicates(self, df):
+        """Summarize duplicate flags added by flag_duplicates"""
+        if '_duplicate_type' not in df.columns:
+            return None
+        duplicate_type = df['_duplicate_type'].astype(object).fillna('')
+        return {
+            'exact': int((duplicate_type == 'exact').sum()),
+            'near': int((duplicate_type == 'near').sum()),
+            'examples': df.loc[duplicate_type != '', ['OBJECTID', '_duplicate_of', '_duplicate_type']].head(10),
+        }
+
+    def measurement_bounds(self, df, columns):
+        """Preferred value and bounds of a measurement; text bounds in the preferred column fill missing min/max"""
+        pref_col, min_col, max_col = columns
+        if pref_col not in df.columns:
+            return tuple(np.full(len(df), np.nan) for _ in range(3))
+        # Typed frames keep field text such as '>10.5' beside the parsed number
+        values = df[pref_col].astype(object)
+        original_column = f"_{pref_col}_orig"
+        if original_column in df.columns:
+            original = df[original_column].astype(object)
+            values = original.where(original.notna() & (original != ''), values)
+        pref, low, high = parse_measurements(values.to_numpy())
+        if min_col in df.columns:
+            measured_low = self.numeric_values(df[min_col])
+            low = np.where(np.isnan(measured_low), low, measured_low)
+        if max_col in df.columns:
+            measured_high = self.numeric_values(df[max_col])
+            high = np.where(np.isnan(measured_high), high, measured_high)
+        return pref, low, high
+
+    def derive_kinematics(self, df):
+        """Add net slip, rake and horizontal/vertical slip components with min/max bounds as whole-column operations"""
+        measurements = {name: self.measurement_bounds(df, columns) for name, columns in self.slip_measurements.items()}
+        plunge = self.numeric_values(df['Plunge']) if 'Plunge' in df.columns else np.full(len(df), np.nan)
+        senses = df['Slip_Sense'].to_numpy() if 'Slip_Sense' in df.columns else np.full(len(df), None)
+        lateral_sign, dip_sign = slip_sense_signs(senses)
+        
+        derived = slip_kinematics(measurements['lateral'], measurements['heave'], measurements['vertical'],
+                                  measurements['dip'], measurements['net'], plunge, lateral_sign, dip_sign)
+        for name, col in self.kinematic_columns.items():
+            df[col] = derived[name]
+        return df
+
+    def azimuth_statistics(self, df, column='Local_Fault_Azimuth_Degrees', by='event', cell_size_deg=0.01, axial=None):
+        """Circular mean and dispersion of an azimuth column per event or per lat/lon grid cell"""
+        degrees = parse_measurements(df[column].to_numpy())[0]
+        
+        # Fault strikes are lines rather than directions unless stated otherwise
+        if axial is None:
+            axial = column == 'Local_Fault_Azimuth_Degrees'
+        
+        if by == 'event':
+            groups = pd.DataFrame({'event': self.record_events(df)})
+        elif by == 'cell':
+            lat = self.numeric_values(df['_latitude'])
+            lon = self.numeric_values(df['_longitude'])
+            groups = pd.DataFrame({'cell_lat': np.floor(lat / cell_size_deg) * cell_size_deg,
+                                   'cell_lon': np.floor(lon / cell_size_deg) * cell_size_deg})
+        else:
+            groups = df[[by] if isinstance(by, str) else list(by)].reset_index(drop=True)
+        
+        # Records without a group get code -1 and are left out
+        grouper = groups.groupby(list(groups.columns), sort=True, dropna=True)
+        keys = grouper.size().index.to_frame(index=False)
+        statistics = circular_statistics(degrees, grouper.ngroup().to_numpy(), len(keys), axial)
+        result = keys.assign(**statistics)
+        return result[result['count'] > 0].reset_index(drop=True)
+
     def finalize_single_dataset(self, df):
         """Finalize single dataset by filling NaN values appropriately"""
+        if self.typed_schema:
+            return self.apply_schema_types(df)
+        return self.fill_missing_values(df)
+
+    def fill_missing_values(self, df):
+        """Fill NaN with '' in text and new columns, leaving numeric columns as NaN"""
         for col in df.columns:
-            if col in ['Notes', 'Vector_Offset_Feature_Notes', 'Slip_Offset_Feature_Notes'] or col.startswith('_'):
+            if pd.api.types.is_datetime64_any_dtype(df[col]):
+                continue
+            elif col in self.text_fields or col.startswith('_'):
                 df[col] = df[col].fillna('')
             elif df[col].dtype == 'object':
                 df[col] = df[col].fillna('')
@@ -305,7 +1156,322 @@ class EarthquakeDataMapper:
                 df[col] = df[col].fillna(np.nan)
         return df
 
-    def generate_migration_report(self, napa_df, ridgecrest_df, napa_current, ridgecrest_current, consolidated_df):
+    def load_schema_types(self):
+        """Load esri field types for the current schema from post_ridgecrest_schema.csv"""
+        if self.schema_types is None:
+            schema_df = pd.read_csv(self.schema_file)
+            self.schema_types = dict(zip(schema_df['Field Name'], schema_df['Field Type']))
+            logger.info(f"Loaded {len(self.schema_types)} field types from {self.schema_file}")
+        return self.schema_types
+
+    def to_numeric_or_none(self, series, col, warn=True):
+        """Convert a column to numbers, or return None if it holds non-numeric text"""
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            return series
+        numeric = pd.to_numeric(series, errors='coerce')
+        unparsed = int((numeric.isna() & series.notna() & (series.astype(str).str.strip() != '')).sum())
+        if unparsed:
+            if warn:
+                logger.warning(f"Column {col}: {unparsed} non-numeric values, keeping as text")
+            return None
+        return numeric
+
+    def text_value(self, value):
+        """Format a value as text, using the short float32 form for values that fit in float32"""
+        if isinstance(value, float) and float(np.float32(value)) == value:
+            return str(np.float32(value))
+        return str(value)
+
+    def to_text_dtype(self, series, col):
+        """Store a text column as categorical when it has few distinct values"""
+        # Values are normalized to str so the column has one type; '' counts as missing
+        missing = (series.isna() | (series.astype(object) == '')).to_numpy()
+        series = series.astype(object).map(self.text_value).where(~missing, None)
+        n_unique = series.nunique(dropna=True)
+        if col not in self.text_fields and n_unique <= len(series) * self.category_max_unique_ratio:
+            return series.astype('category')
+        return series
+
+    def schema_numbers(self, df, series, col):
+        """Numbers of a numeric schema column, parsing field text such as '>10.5' and keeping that text in _<col>_orig"""
+        numeric = self.to_numeric_or_none(series, col, warn=False)
+        if numeric is not None:
+            return numeric
+        
+        # Only values that are not plain numbers are kept, so the column does not depend on chunk boundaries
+        original_column = f"_{col}_orig"
+        text = series.where(pd.to_numeric(series, errors='coerce').isna())
+        df[original_column] = self.to_text_dtype(text, original_column)
+        pref = pd.Series(parse_measurements(series.to_numpy())[0], index=series.index)
+        logger.info(f"Column {col}: parsed text values to numbers, raw values kept in {original_column}")
+        return pref
+
+    def apply_schema_types(self, df):
+        """Cast columns to compact dtypes declared in the current schema or inferred from the source"""
+        schema_types = self.load_schema_types()
+        
+        for col in df.columns:
+            field_type = schema_types.get(col)
+            series = df[col]
+            
+            if field_type == 'esriFieldTypeOID':
+                df[col] = series.astype('int32')
+            elif field_type in ('esriFieldTypeSmallInteger', 'esriFieldTypeInteger'):
+                numeric = self.schema_numbers(df, series, col)
+                if (numeric.dropna() % 1 == 0).all():
+                    df[col] = numeric.astype('Int16' if field_type == 'esriFieldTypeSmallInteger' else 'Int32')
+                else:
+                    df[col] = numeric.astype('float32')
+            elif field_type == 'esriFieldTypeDouble':
+                df[col] = self.schema_numbers(df, series, col).astype('float32')
+            elif field_type == 'esriFieldTypeDate':
+                df[col] = pd.to_datetime(series, errors='coerce')
+            elif field_type in ('esriFieldTypeString', 'esriFieldTypeGlobalID'):
+                df[col] = self.to_text_dtype(series, col)
+            elif col in self.coordinate_fields:
+                df[col] = pd.to_numeric(series, errors='coerce').astype('float64')
+            elif col in self.object_id_reference_fields:
+                df[col] = pd.to_numeric(series, errors='coerce').astype('Int32')
+            elif pd.api.types.is_datetime64_any_dtype(series) or col == self.violation_column:
+                # Normalized dates and the violation bitmask already have their final dtype
+                continue
+            elif self.get_metadata_types().get(col) == 'category':
+                # Enumerated domain in the source metadata
+                df[col] = self.to_text_dtype(series, col).astype('category')
+            else:
+                # Extension columns: numbers become float32, text becomes categorical when repetitive
+                numeric_domain = self.get_metadata_types().get(col) == 'numeric'
+                numeric = None if series.isna().all() else self.to_numeric_or_none(series, col, warn=numeric_domain)
+                df[col] = self.to_text_dtype(series, col) if numeric is None else numeric.astype('float32')
+        
+        return df
+
+    def memory_usage_comparison(self, current_df):
+        """Compare memory of a mapped frame finalized with '' fills versus compact schema types"""
+        object_bytes = self.fill_missing_values(current_df.copy()).memory_usage(deep=True).sum()
+        typed_bytes = self.apply_schema_types(current_df.copy()).memory_usage(deep=True).sum()
+        return {'object_bytes': int(object_bytes), 'typed_bytes': int(typed_bytes)}
+
+    def get_consolidated_schema_fields(self, names):
+        """Get consolidated column set for a group of registered events, matching consolidate_events"""
+        all_columns = set()
+        for name in names:
+            all_columns.update(self.get_extended_schema_fields(self.events[name]['mapping'],
+                                                               self.events[name]['date_formats']))
+        return sorted(all_columns) + list(self.kinematic_columns.values())
+
+    def stream_dataset(self, file_path, mapping, source_label, editor, output_file,
+                       consolidated_handle=None, consolidated_columns=None,
+                       consolidated_start=1, chunksize=50000, date_formats=None, timezone='UTC',
+                       **read_kwargs):
+        """Map a CSV dataset chunk by chunk, appending each chunk to the output files"""
+        if not file_path or not file_path.lower().endswith(('.csv', '.txt', '.tsv')):
+            logger.error(f"Streaming mode only supports delimited text input: {file_path}")
+            return 0
+        
+        encoding, sep = self.detect_text_format(file_path)
+        read_kwargs.setdefault('encoding', encoding)
+        read_kwargs.setdefault('sep', sep)
+        
+        # Read values as text so column formatting does not depend on chunk boundaries
+        read_kwargs.setdefault('dtype', str)
+        
+        # Every chunk is written with the same columns, whichever values it happens to hold
+        columns = self.get_extended_schema_fields(mapping, date_formats)
+        
+        records = 0
+        with open(output_file, 'w', encoding='utf-8', newline='') as event_handle:
+            for chunk in pd.read_csv(file_path, chunksize=chunksize, **read_kwargs):
+                chunk = chunk.reset_index(drop=True)
+                current_chunk = self.map_to_current(chunk, mapping, source_label, editor, objectid_start=records + 1,
+                                                    date_formats=date_formats, timezone=timezone)
+                current_chunk = self.finalize_single_dataset(current_chunk).reindex(columns=columns)
+                current_chunk.to_csv(event_handle, index=False, header=(records == 0))
+                
+                # Append to consolidated output with its own sequential OBJECTID
+                if consolidated_handle is not None:
+                    consolidated_chunk = self.derive_kinematics(current_chunk.reindex(columns=consolidated_columns))
+                    consolidated_chunk['OBJECTID'] = np.arange(consolidated_start + records,
+                                                               consolidated_start + records + len(current_chunk))
+                    consolidated_chunk.to_csv(consolidated_handle, index=False, header=False)
+                
+                records += len(current_chunk)
+                logger.info(f"Streamed {records} {source_label} records to {output_file}")
+        
+        return records
+
+    def stream_migration(self, date_str, chunksize=50000):
+        """Stream registered events to per-event and consolidated CSV outputs with bounded memory"""
+        names = [name for name in self.events if self.events[name]['source_file']]
+        consolidated_columns = self.get_consolidated_schema_fields(names)
+        consolidated_output_file = f"consolidated_earthquake_observations_{date_str}.csv"
+        
+        record_counts = {}
+        with open(consolidated_output_file, 'w', encoding='utf-8', newline='') as consolidated_handle:
+            pd.DataFrame(columns=consolidated_columns).to_csv(consolidated_handle, index=False)
+            
+            for name in names:
+                event = self.events[name]
+                with self.measure_stage('stream', name) as stage:
+                    record_counts[name] = self.stream_dataset(
+                        self.resolve_source(event['source_file']), event['mapping'], event['source_label'], event['editor'],
+                        f"{name.lower()}_current_schema_{date_str}.csv",
+                        consolidated_handle, consolidated_columns, sum(record_counts.values()) + 1, chunksize,
+                        event['date_formats'], event['timezone'], **event['read_options'])
+                    stage['rows'] = record_counts[name]
+        
+        logger.info(f"Consolidated dataset streamed to: {consolidated_output_file}")
+        return record_counts
+
+    def write_columnar_dataset(self, event_frames, dataset_dir):
+        """Write mapped datasets to a Parquet dataset partitioned by source event"""
+        if pa is None:
+            logger.error("pyarrow is required for columnar output")
+            return None
+        
+        # Align all events into one typed table so every partition shares a schema
+        combined_df = pd.concat([df.assign(event=event) for event, df in event_frames.items()], ignore_index=True)
+        combined_df['OBJECTID'] = range(1, len(combined_df) + 1)
+        event_column = combined_df.pop('event')
+        combined_df = self.apply_schema_types(combined_df)
+        combined_df['event'] = event_column.astype(str)
+        
+        table = pa.Table.from_pandas(combined_df, preserve_index=False)
+        ds.write_dataset(table, dataset_dir, format='parquet', partitioning=['event'],
+                         partitioning_flavor='hive', existing_data_behavior='delete_matching')
+        logger.info(f"Columnar dataset saved to: {dataset_dir} ({len(combined_df)} records, "
+                    f"{len(event_frames)} events)")
+        return dataset_dir
+
+    def read_columnar_dataset(self, dataset_dir, columns=None, events=None):
+        """Read selected columns and events from a partitioned Parquet dataset"""
+        if pa is None:
+            logger.error("pyarrow is required for columnar input")
+            return None
+        
+        # Memory-map the Parquet files and prune partitions by event
+        dataset = ds.dataset(dataset_dir, format='parquet', partitioning='hive',
+                             filesystem=pafs.LocalFileSystem(use_mmap=True))
+        event_filter = ds.field('event').isin(list(events)) if events else None
+        table = dataset.to_table(columns=columns, filter=event_filter)
+        return table.to_pandas()
+
+    def store_column_types(self):
+        """SQLite types of numeric and date schema columns, coordinates and parsed dates for an ObservationStore"""
+        types = {col: ESRI_COLUMN_TYPES[field_type] for col, field_type in self.load_schema_types().items()
+                 if field_type in ESRI_COLUMN_TYPES}
+        types.update({col: 'REAL' for col in self.coordinate_fields})
+        for event in self.events.values():
+            types.update({self.date_columns(field)[0]: 'TIMESTAMP' for field in event['date_formats']})
+        return types
+
+    def store_events(self, event_results, store):
+        """Upsert every mapped event into an ObservationStore"""
+        for name, result in event_results.items():
+            with self.measure_stage('store', name) as stage:
+                stage['rows'] = store.upsert(result['current'], name)
+        return store.count()
+
+    def append_observations(self, name, source_df, store, text_index=None, spatial_index=None):
+        """Map newly received records of a registered event and upsert them without rewriting any output"""
+        with self.measure_stage('append', name) as stage:
+            current_df = self.finalize_single_dataset(self.map_event(name, source_df))
+            stage['rows'] = store.upsert(current_df, name)
+            
+            # Index the stored records so text and spatial queries return the store's OBJECTIDs
+            if text_index is not None or spatial_index is not None:
+                stored_df = store.read(global_ids=current_df['GlobalID'])
+                if text_index is not None:
+                    text_index.add_records(stored_df)
+                if spatial_index is not None:
+                    spatial_index.add_records(stored_df)
+        return stage['rows']
+
+    def record_events(self, df):
+        """Registered event name of each record, from the event column or the Notes source prefix"""
+        if 'event' in df.columns:
+            return df['event'].to_numpy()
+        notes = df['Notes'].astype(str)
+        events = np.full(len(df), None, dtype=object)
+        for name, event in self.events.items():
+            prefix = f"Source: {event['source_label']}"
+            events[(notes.str.startswith(prefix + ';') | (notes == prefix)).to_numpy()] = name
+        return events
+
+    def build_text_index(self, df):
+        """Build an inverted index over the free-text fields keyed by OBJECTID"""
+        return ObservationTextIndex.from_frame(df, self.record_events(df))
+
+    def build_spatial_index(self, df, cell_size_deg=0.01):
+        """Build a grid spatial index over observation coordinates keyed by OBJECTID"""
+        return ObservationSpatialIndex.from_frame(df, cell_size_deg)
+
+    def mapping_version(self, mapping, date_formats=None, timezone='UTC'):
+        """Hash a mapping dict with the schema, date formats and finalize settings it is applied with"""
+        version_key = json.dumps({
+            'mapping': mapping,
+            'date_formats': date_formats or {},
+            'timezone': timezone,
+            'schema_fields': self.current_schema_fields,
+            'typed_schema': self.typed_schema,
+            'measurement_rules': self.get_measurement_rules(),
+        }, sort_keys=True)
+        return hashlib.sha256(version_key.encode('utf-8')).hexdigest()[:16]
+
+    def migrate_incremental(self, cache_dir='.migration_cache', processes=None):
+        """Map each event only when its source file or mapping changed, reusing cached results otherwise"""
+        manifest_file = os.path.join(cache_dir, 'migration_manifest.json')
+        try:
+            with open(manifest_file, encoding='utf-8') as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            manifest = {'events': {}}
+        
+        os.makedirs(cache_dir, exist_ok=True)
+        results = {}
+        changed = {}
+        for name, event in self.events.items():
+            file_path = event['source_file'] and self.resolve_source(event['source_file'])
+            if not file_path:
+                continue
+            if not os.path.exists(file_path):
+                logger.error(f"Source file not found for {name}: {file_path}")
+                continue
+            
+            source_hash = file_content_hash(file_path)
+            version = self.mapping_version(event['mapping'], event['date_formats'], event['timezone'])
+            cache_file = os.path.join(cache_dir, f"{name.lower()}_current.pkl")
+            entry = manifest['events'].get(name, {})
+            
+            if entry.get('sha256') == source_hash and entry.get('mapping_version') == version and os.path.exists(cache_file):
+                results[name] = {'name': name, 'input_records': None, 'input_fields': None,
+                                 'domain_violations': None, 'memory_usage': None, 'stage_metrics': [],
+                                 'current': pd.read_pickle(cache_file)}
+                logger.info(f"{name} unchanged, reusing mapped output from {entry['migration_time']}")
+            else:
+                changed[name] = (file_path, source_hash, version, cache_file)
+        
+        # Remap only the changed events
+        for name, result in self.run_pipeline(list(changed), processes).items():
+            file_path, source_hash, version, cache_file = changed[name]
+            result['current'].to_pickle(cache_file)
+            results[name] = result
+            
+            manifest['events'][name] = {
+                'source': os.path.abspath(file_path),
+                'sha256': source_hash,
+                'mapping_version': version,
+                'migration_time': self.migration_time.isoformat(),
+                'records': len(result['current']),
+            }
+            logger.info(f"{name} remapped: {len(result['current'])} records")
+        
+        with open(manifest_file, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        
+        return {name: results[name] for name in self.events if name in results}
+
+    def generate_migration_report(self, event_results, consolidated_df, memory_usage=None, stage_totals=None):
         """Generate report on data migration"""
         report = []
         report.append("EARTHQUAKE DATA MIGRATION REPORT")
@@ -314,17 +1480,18 @@ class EarthquakeDataMapper:
         report.append("")
         
         report.append("INPUT DATASETS:")
-        if napa_df is not None:
-            report.append(f"  Napa (2014): {len(napa_df)} records, {len(napa_df.columns)} fields")
-        if ridgecrest_df is not None:
-            report.append(f"  Ridgecrest (2019): {len(ridgecrest_df)} records, {len(ridgecrest_df.columns)} fields")
+        for name, result in event_results.items():
+            if result['input_records'] is None:
+                report.append(f"  {self.events[name]['source_label']}: unchanged, reused cached mapping")
+            else:
+                report.append(f"  {self.events[name]['source_label']}: {result['input_records']} records, "
+                              f"{result['input_fields']} fields")
         report.append("")
         
         report.append("OUTPUT DATASETS:")
-        if napa_current is not None:
-            report.append(f"  Napa mapped: {len(napa_current)} records, {len(napa_current.columns)} columns")
-        if ridgecrest_current is not None:
-            report.append(f"  Ridgecrest mapped: {len(ridgecrest_current)} records, {len(ridgecrest_current.columns)} columns")
+        for name, result in event_results.items():
+            current_df = result['current']
+            report.append(f"  {name} mapped: {len(current_df)} records, {len(current_df.columns)} columns")
         if consolidated_df is not None:
             report.append(f"  Consolidated: {len(consolidated_df)} records, {len(consolidated_df.columns)} columns")
         report.append("")
@@ -338,16 +1505,90 @@ class EarthquakeDataMapper:
         report.append("")
         
         report.append("FIELD MAPPING SUMMARY:")
-        if napa_df is not None:
-            napa_direct = sum(1 for v in self.napa_mapping.values() if v is not None and not v.startswith('_'))
-            napa_new = sum(1 for v in self.napa_mapping.values() if v is not None and v.startswith('_'))
-            report.append(f"  Napa - Direct mappings: {napa_direct}, New columns: {napa_new}")
-        
-        if ridgecrest_df is not None:
-            ridge_direct = sum(1 for v in self.ridgecrest_mapping.values() if v is not None and not v.startswith('_'))
-            ridge_new = sum(1 for v in self.ridgecrest_mapping.values() if v is not None and v.startswith('_'))
-            report.append(f"  Ridgecrest - Direct mappings: {ridge_direct}, New columns: {ridge_new}")
+        for name in event_results:
+            mapping = self.events[name]['mapping']
+            direct = sum(1 for v in mapping.values() if v is not None and not v.startswith('_'))
+            new = sum(1 for v in mapping.values() if v is not None and v.startswith('_'))
+            report.append(f"  {name} - Direct mappings: {direct}, New columns: {new}")
+        report.append("")
+        
+        report.append("DOMAIN VALIDATION (FGDC metadata):")
+        for name, result in event_results.items():
+            violations = result.get('domain_violations')
+            if violations is None:
+                continue
+            if not violations:
+                report.append(f"  {name}: all values within declared domains")
+            for col, violation in violations.items():
+                report.append(f"  {name} {col}: {violation['invalid']} values outside domain "
+                              f"(e.g. {', '.join(violation['examples'])})")
+        report.append("")
+        
+        report.append("MEASUREMENT VALIDATION (min/pref/max triplets):")
+        for name, result in event_results.items():
+            summary = self.summarize_measurement_violations(result['current'])
+            if summary is None:
+                continue
+            report.append(f"  {name}: {summary['rows']} of {len(result['current'])} records flagged in {self.violation_column}")
+            for rule_name, count in summary['rules'].items():
+                report.append(f"    {rule_name}: {count}")
+        report.append("")
+        
+        report.append("DATE NORMALIZATION (UTC):")
+        for name, result in event_results.items():
+            for col, summary in self.summarize_dates(result['current']).items():
+                report.append(f"  {name} {col}: {summary['parsed']} parsed, {summary['unparsed']} unparseable, "
+                              f"range {summary['start']} to {summary['end']}")
+                if summary['unparsed_examples']:
+                    report.append(f"    Unparseable values: {', '.join(summary['unparsed_examples'])}")
         report.append("")
+
+        if consolidated_df is not None and self.kinematic_columns['net'] in consolidated_df.columns:
+            report.append("SLIP KINEMATICS (consolidated):")
+            events = self.record_events(consolidated_df)
+            net = self.numeric_values(consolidated_df[self.kinematic_columns['net']])
+            rake = self.numeric_values(consolidated_df[self.kinematic_columns['rake']])
+            strikes = self.azimuth_statistics(consolidated_df).set_index('event')
+            for name in event_results:
+                in_event = events == name
+                line = (f"  {name}: net slip for {int((in_event & ~np.isnan(net)).sum())} records, "
+                        f"rake for {int((in_event & ~np.isnan(rake)).sum())}")
+                if name in strikes.index:
+                    line += (f"; fault strike mean {strikes.loc[name, 'mean_azimuth']:.1f} deg, "
+                             f"circular std {strikes.loc[name, 'circular_std_deg']:.1f} deg")
+                report.append(line)
+            report.append("")
+        
+        duplicate_summary = self.summarize_duplicates(consolidated_df) if consolidated_df is not None else None
+        if duplicate_summary:
+            report.append("DUPLICATE CHECK:")
+            report.append(f"  Exact duplicates flagged: {duplicate_summary['exact']}")
+            report.append(f"  Near duplicates flagged: {duplicate_summary['near']}")
+            for _, row in duplicate_summary['examples'].iterrows():
+                report.append(f"    OBJECTID {row['OBJECTID']} duplicates {row['_duplicate_of']} ({row['_duplicate_type']})")
+            report.append("")
+        
+        if memory_usage:
+            report.append("MEMORY USAGE (object fills vs typed schema):")
+            for label, usage in memory_usage.items():
+                object_mb = usage['object_bytes'] / 1024 ** 2
+                typed_mb = usage['typed_bytes'] / 1024 ** 2
+                saving = 100 * (1 - usage['typed_bytes'] / usage['object_bytes']) if usage['object_bytes'] else 0
+                report.append(f"  {label}: {object_mb:.2f} MB -> {typed_mb:.2f} MB ({saving:.0f}% smaller)")
+            report.append("")
+        
+        if stage_totals:
+            report.append("PERFORMANCE (per stage, see migration_metrics JSON for details):")
+            for stage, total in stage_totals.items():
+                line = f"  {stage}: {total['seconds']:.3f} s"
+                if total['rows'] and total['seconds']:
+                    line += f", {total['rows'] / total['seconds']:,.0f} rows/s"
+                if total['peak_mb'] is not None:
+                    line += f", peak {total['peak_mb']:.1f} MB traced"
+                if total['max_rss_mb'] is not None:
+                    line += f", process peak {total['max_rss_mb']:.0f} MB"
+                report.append(line)
+            report.append("")
         
         report.append("CRITICAL IMPROVEMENTS:")
         report.append("  - FIXED: Location data now in dedicated columns (was in Notes)")
@@ -358,93 +1599,139 @@ class EarthquakeDataMapper:
         
         return "\n".join(report)
 
-def main():
+def main(streaming=False, chunksize=50000, typed_schema=False, columnar=False, incremental=False,
+         spatial_index=False, deduplicate=False, processes=None, instrument=False, sciencebase=False, offline=None,
+         store=False, text_index=False):
     """Main execution function"""
     # Initialize mapper
-    mapper = EarthquakeDataMapper()
+    mapper = EarthquakeDataMapper(typed_schema=typed_schema, instrument=instrument, offline=offline)
     
     # File paths (update these to your actual file locations)
-    napa_file = "C:/Users/rajuv/OneDrive/Desktop/Work/SCEC SOURCES Internship/SCEC/Mapping to Current/napa_observations.csv" 
-    ridgecrest_file = "C:/Users/rajuv/OneDrive/Desktop/Work/SCEC SOURCES Internship/SCEC/Mapping to Current/ridgecrest_observations.csv"  
+    mapper.set_event_source('Napa', "C:/Users/rajuv/OneDrive/Desktop/Work/SCEC SOURCES Internship/SCEC/Mapping to Current/napa_observations.csv")
+    mapper.set_event_source('Ridgecrest', "C:/Users/rajuv/OneDrive/Desktop/Work/SCEC SOURCES Internship/SCEC/Mapping to Current/ridgecrest_observations.csv")
+    
+    # Or pull the published releases from ScienceBase (cached locally, revalidated on each run)
+    if sciencebase:
+        mapper.use_sciencebase_sources()
     
     try:
-        # Load datasets
-        logger.info("Starting earthquake data migration...")
-        napa_df = mapper.load_napa_data(napa_file)
-        ridgecrest_df = mapper.load_ridgecrest_data(ridgecrest_file)
-        
-        # Check if loading failed
-        if napa_df is None and ridgecrest_df is None:
-            logger.error("Failed to load both datasets")
+        # Streaming mode: map chunk by chunk straight to the output files
+        if streaming:
+            logger.info("Starting streaming earthquake data migration...")
+            date_str = datetime.now().strftime('%Y%m%d')
+            record_counts = mapper.stream_migration(date_str, chunksize)
+            if instrument:
+                mapper.write_stage_metrics(f"migration_metrics_{date_str}.json")
+            print("\nStreaming migration completed successfully!")
+            print(f"Total records processed: {sum(record_counts.values())}")
             return
-        elif napa_df is None:
-            logger.warning("Failed to load Napa data - proceeding with Ridgecrest only")
-        elif ridgecrest_df is None:
-            logger.warning("Failed to load Ridgecrest data - proceeding with Napa only")
         
-        # Map to current schema
-        napa_current = None
-        ridgecrest_current = None
+        if incremental:
+            # Reuse mapped outputs for events whose source and mapping are unchanged
+            logger.info("Starting incremental earthquake data migration...")
+            event_results = mapper.migrate_incremental(processes=processes)
+        else:
+            # Load and map every registered event
+            logger.info("Starting earthquake data migration...")
+            event_results = mapper.run_pipeline(processes=processes)
         
-        if napa_df is not None:
-            napa_current = mapper.map_napa_to_current(napa_df)
-            napa_current = mapper.finalize_single_dataset(napa_current)
-        
-        if ridgecrest_df is not None:
-            ridgecrest_current = mapper.map_ridgecrest_to_current(ridgecrest_df)
-            ridgecrest_current = mapper.finalize_single_dataset(ridgecrest_current)
+        # Check if loading failed
+        if not event_results:
+            logger.error("Failed to load any dataset")
+            return
         
         # Save individual datasets
         date_str = datetime.now().strftime('%Y%m%d')
+        output_files = []
         
-        if napa_current is not None:
-            napa_output_file = f"napa_current_schema_{date_str}.csv"
-            napa_current.to_csv(napa_output_file, index=False)
-            logger.info(f"Napa dataset saved to: {napa_output_file}")
-        
-        if ridgecrest_current is not None:
-            ridgecrest_output_file = f"ridgecrest_current_schema_{date_str}.csv"
-            ridgecrest_current.to_csv(ridgecrest_output_file, index=False)
-            logger.info(f"Ridgecrest dataset saved to: {ridgecrest_output_file}")
+        for name, result in event_results.items():
+            output_file = f"{name.lower()}_current_schema_{date_str}.csv"
+            with mapper.measure_stage('write', name) as stage:
+                result['current'].to_csv(output_file, index=False)
+                stage['rows'] = len(result['current'])
+            output_files.append(output_file)
+            logger.info(f"{name} dataset saved to: {output_file}")
         
         # Create consolidated dataset (optional)
         consolidated = None
-        if napa_current is not None and ridgecrest_current is not None:
-            consolidated = mapper.consolidate_datasets(napa_current, ridgecrest_current)
+        if len(event_results) > 1:
+            consolidated = mapper.consolidate_events([result['current'] for result in event_results.values()], deduplicate)
             consolidated_output_file = f"consolidated_earthquake_observations_{date_str}.csv"
-            consolidated.to_csv(consolidated_output_file, index=False)
+            with mapper.measure_stage('write', 'Consolidated') as stage:
+                consolidated.to_csv(consolidated_output_file, index=False)
+                stage['rows'] = len(consolidated)
+            output_files.append(consolidated_output_file)
             logger.info(f"Consolidated dataset saved to: {consolidated_output_file}")
         
+        # Columnar output partitioned by event (optional)
+        if columnar:
+            event_frames = {name: result['current'] for name, result in event_results.items()}
+            with mapper.measure_stage('write', 'Columnar') as stage:
+                mapper.write_columnar_dataset(event_frames, f"earthquake_observations_{date_str}.parquet")
+                stage['rows'] = sum(len(df) for df in event_frames.values())
+        
+        # Persistent SQLite store keyed by GlobalID, updated in place on every run (optional)
+        stored_df = None
+        if store:
+            store_file = "earthquake_observations.sqlite"
+            with ObservationStore(store_file, mapper.store_column_types()) as observation_store:
+                stored = mapper.store_events(event_results, observation_store)
+                if text_index or spatial_index:
+                    stored_df = observation_store.read()
+            output_files.append(store_file)
+            logger.info(f"Observation store {store_file}: {stored} records")
+        
+        # Full-text index, over the store when there is one so its OBJECTIDs stay valid (optional)
+        if text_index:
+            if stored_df is not None:
+                text_source, text_index_file = stored_df, "earthquake_observations_text_index.npz"
+            else:
+                text_source = consolidated if consolidated is not None else next(iter(event_results.values()))['current']
+                text_index_file = f"text_index_{date_str}.npz"
+            with mapper.measure_stage('text_index') as stage:
+                mapper.build_text_index(text_source).save(text_index_file)
+                stage['rows'] = len(text_source)
+            output_files.append(text_index_file)
+        
+        # Spatial index, over the store when there is one so its OBJECTIDs stay valid (optional)
+        if spatial_index:
+            if stored_df is not None:
+                index_source, index_file = stored_df, "earthquake_observations_spatial_index.npz"
+            else:
+                index_source = consolidated if consolidated is not None else next(iter(event_results.values()))['current']
+                index_file = f"spatial_index_{date_str}.npz"
+            with mapper.measure_stage('spatial_index') as stage:
+                mapper.build_spatial_index(index_source).save(index_file)
+                stage['rows'] = len(index_source)
+            output_files.append(index_file)
+        
         # Generate and save report
-        report = mapper.generate_migration_report(napa_df, ridgecrest_df, napa_current, ridgecrest_current, consolidated)
+        memory_usage = {f"{name} mapped": result['memory_usage']
+                        for name, result in event_results.items() if result['memory_usage']}
+        stage_totals = None
+        if instrument:
+            metrics_file = f"migration_metrics_{date_str}.json"
+            stage_totals = mapper.write_stage_metrics(metrics_file)
+            output_files.append(metrics_file)
+        report = mapper.generate_migration_report(event_results, consolidated, memory_usage, stage_totals)
         report_file = f"migration_report_{date_str}.txt"
         with open(report_file, 'w', encoding='utf-8') as f:
             f.write(report)
         logger.info(f"Migration report saved to: {report_file}")
         
         print("\nMigration completed successfully!")
-        output_files = []
-        if napa_current is not None:
-            output_files.append(f"napa_current_schema_{date_str}.csv")
-        if ridgecrest_current is not None:
-            output_files.append(f"ridgecrest_current_schema_{date_str}.csv")
-        if consolidated is not None:
-            output_files.append(f"consolidated_earthquake_observations_{date_str}.csv")
         output_files.append(report_file)
         
         print(f"Output files: {', '.join(output_files)}")
-        total_records = 0
-        if napa_current is not None:
-            total_records += len(napa_current)
-        if ridgecrest_current is not None:
-            total_records += len(ridgecrest_current)
+        total_records = sum(len(result['current']) for result in event_results.values())
         print(f"Total records processed: {total_records}")
         
         # Show new columns created
-        if ridgecrest_current is not None:
-            new_columns = [col for col in ridgecrest_current.columns if col.startswith('_')]
-            print(f"New columns created: {len(new_columns)}")
-            print(f"New columns: {', '.join(sorted(new_columns))}")
+        new_columns = set()
+        for result in event_results.values():
+            new_columns.update(col for col in result['current'].columns if col.startswith('_'))
+        print(f"New columns created: {len(new_columns)}")
+        print(f"New columns: {', '.join(sorted(new_columns))}")
         
     except Exception as e:
         logger.error(f"Migration failed: {e}")
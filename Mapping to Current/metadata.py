@@ -0,0 +1,235 @@
+"""
+FGDC Metadata Schema
+Streams attribute labels, definitions, units and domains out of USGS FGDC metadata XML
+"""
+
+import xml.etree.ElementTree as ET
+import hashlib
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Bump when the compiled layout changes so stale cache files are ignored
+SCHEMA_VERSION = 1
+
+
+def clean_text(text):
+    """Collapse the line wrapping and indentation FGDC files carry inside text elements"""
+    return ' '.join(text.split()) if text else ''
+
+
+def file_content_hash(file_path, block_size=1 << 20):
+    """Compute the SHA-256 of a file, reading it in blocks"""
+    digest = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def parse_bound(text):
+    """Range bounds are numbers for measurements but may be dates or other text"""
+    text = clean_text(text)
+    try:
+        return float(text)
+    except ValueError:
+        return text or None
+
+
+class AttributeSchema:
+    """Attribute definitions and domains compiled from one FGDC metadata file"""
+
+    def __init__(self, attributes=None, source=None, sha256=None, size=None, mtime_ns=None):
+        # Attribute label -> label, definition, unit, domain type and domain values
+        self.attributes = attributes or {}
+        self.source = source
+        self.sha256 = sha256
+        # Size and modification time of the compiled XML, checked before hashing it
+        self.size = size
+        self.mtime_ns = mtime_ns
+
+    def __len__(self):
+        return len(self.attributes)
+
+    def __contains__(self, label):
+        return label in self.attributes
+
+    def __getitem__(self, label):
+        return self.attributes[label]
+
+    @staticmethod
+    def parse_attribute(attr):
+        """Compile one <attr> element into a plain dict"""
+        enumerated, ranges, codesets, descriptions = [], [], [], []
+        unit = None
+        for domain in attr.iter('attrdomv'):
+            for edom in domain.findall('edom'):
+                enumerated.append({'value': clean_text(edom.findtext('edomv')),
+                                   'definition': clean_text(edom.findtext('edomvd'))})
+            for rdom in domain.findall('rdom'):
+                ranges.append((parse_bound(rdom.findtext('rdommin')), parse_bound(rdom.findtext('rdommax'))))
+                unit = unit or clean_text(rdom.findtext('attrunit')) or None
+            for codeset in domain.findall('codesetd'):
+                codesets.append(clean_text(codeset.findtext('codesetn')))
+            for udom in domain.findall('udom'):
+                descriptions.append(clean_text(udom.text))
+
+        if enumerated:
+            domain_type = 'enumerated'
+        elif ranges:
+            domain_type = 'range'
+        elif codesets:
+            domain_type = 'codeset'
+        else:
+            domain_type = 'unrepresentable'
+
+        return {
+            'label': clean_text(attr.findtext('attrlabl')),
+            'definition': clean_text(attr.findtext('attrdef')),
+            'unit': unit,
+            'domain_type': domain_type,
+            'values': enumerated,
+            'min': ranges[0][0] if ranges else None,
+            'max': ranges[0][1] if ranges else None,
+            'codeset': codesets[0] if codesets else None,
+            'description': ' '.join(descriptions),
+        }
+
+    @classmethod
+    def from_xml(cls, xml_file):
+        """Stream <attr> elements from a metadata file, discarding each once it is compiled"""
+        attributes = {}
+        parents = []
+        for event, elem in ET.iterparse(xml_file, events=('start', 'end')):
+            if event == 'start':
+                parents.append(elem)
+                continue
+            parents.pop()
+            if elem.tag == 'attr' and elem.find('attrlabl') is not None:
+                attribute = cls.parse_attribute(elem)
+                attributes[attribute['label']] = attribute
+                # Drop the element so memory stays bounded by one attribute, not the whole document
+                parents[-1].remove(elem)
+            elif len(parents) == 1:
+                # Finished top-level sections (idinfo, spref, ...) are not needed either
+                parents[-1].remove(elem)
+
+        source = xml_file if isinstance(xml_file, str) else getattr(xml_file, 'name', None)
+        logger.info(f"Parsed {len(attributes)} attribute definitions from {source}")
+        return cls(attributes, source)
+
+    @classmethod
+    def load(cls, xml_file, cache_file=None):
+        """Load a compiled schema from cache_file, re-parsing the XML only when it changed"""
+        stat = os.stat(xml_file)
+        sha256 = None
+        if cache_file and os.path.exists(cache_file):
+            try:
+                schema = cls.from_json(cache_file)
+                # Unchanged size and modification time: the XML is not read at all
+                if (schema.size, schema.mtime_ns) == (stat.st_size, stat.st_mtime_ns):
+                    return schema
+                sha256 = file_content_hash(xml_file)
+                if schema.sha256 == sha256:
+                    # Touched but unchanged; record the new modification time
+                    schema.size, schema.mtime_ns = stat.st_size, stat.st_mtime_ns
+                    schema.save(cache_file)
+                    return schema
+            except (OSError, ValueError, KeyError):
+                pass
+            logger.info(f"Metadata changed, recompiling schema for {xml_file}")
+
+        schema = cls.from_xml(xml_file)
+        schema.sha256 = sha256 or file_content_hash(xml_file)
+        schema.size, schema.mtime_ns = stat.st_size, stat.st_mtime_ns
+        if cache_file:
+            schema.save(cache_file)
+        return schema
+
+    def save(self, cache_file):
+        """Serialize the compiled schema as JSON"""
+        os.makedirs(os.path.dirname(os.path.abspath(cache_file)), exist_ok=True)
+        with open(cache_file, 'w', encoding='utf-8') as f:
+            json.dump({'version': SCHEMA_VERSION, 'source': self.source, 'sha256': self.sha256,
+                       'size': self.size, 'mtime_ns': self.mtime_ns, 'attributes': self.attributes}, f, indent=2)
+        logger.info(f"Compiled metadata schema saved to: {cache_file}")
+
+    @classmethod
+    def from_json(cls, cache_file):
+        """Load a schema written by save()"""
+        with open(cache_file, encoding='utf-8') as f:
+            data = json.load(f)
+        if data.get('version') != SCHEMA_VERSION:
+            raise ValueError(f"Schema cache version {data.get('version')} is not {SCHEMA_VERSION}")
+        return cls(data['attributes'], data['source'], data['sha256'], data.get('size'), data.get('mtime_ns'))
+
+    def is_numeric_range(self, label):
+        """True for range domains with numeric bounds"""
+        attribute = self.attributes.get(label)
+        return (attribute is not None and attribute['domain_type'] == 'range'
+                and isinstance(attribute['min'], float) and isinstance(attribute['max'], float))
+
+    def categories(self, label):
+        """Enumerated values of an attribute, or None when it is not enumerated"""
+        attribute = self.attributes.get(label)
+        if attribute is None or attribute['domain_type'] != 'enumerated':
+            return None
+        return [value['value'] for value in attribute['values']]
+
+    def domain_violations(self, series, label):
+        """Boolean mask of present values outside an attribute's enumerated or numeric range domain"""
+        text = series.astype('string').str.strip()
+        present = (text.notna() & (text != '')).fillna(False).astype(bool)
+        categories = self.categories(label)
+
+        if categories is not None:
+            # Compare as text, and numerically so 1.0 read by pandas still matches a declared '1'
+            allowed = set(categories)
+            invalid = present & ~text.isin(allowed).astype(bool)
+            numeric_allowed = pd.to_numeric(pd.Series(categories), errors='coerce').dropna()
+            if len(numeric_allowed):
+                numeric = pd.to_numeric(text, errors='coerce')
+                invalid &= ~numeric.isin(numeric_allowed.to_numpy())
+            return invalid
+
+        if self.is_numeric_range(label):
+            attribute = self.attributes[label]
+            numeric = pd.to_numeric(text, errors='coerce')
+            outside = (numeric < attribute['min']) | (numeric > attribute['max'])
+            return present & (numeric.isna() | outside)
+
+        return pd.Series(np.zeros(len(series), dtype=bool), index=series.index)
+
+    def validate(self, df):
+        """Count values outside their declared domain for every described column of a source frame"""
+        violations = {}
+        for col in df.columns:
+            if col not in self.attributes:
+                continue
+            invalid = self.domain_violations(df[col], col)
+            if invalid.any():
+                violations[col] = {
+                    'invalid': int(invalid.sum()),
+                    'examples': df.loc[invalid, col].astype(str).unique()[:5].tolist(),
+                }
+        return violations
+
+    def to_frame(self):
+        """One row per attribute: label, definition, unit and domain summary"""
+        rows = []
+        for attribute in self.attributes.values():
+            rows.append({
+                'Field': attribute['label'],
+                'Definition': attribute['definition'],
+                'Unit': attribute['unit'],
+                'Domain': attribute['domain_type'],
+                'Values': ', '.join(self.categories(attribute['label']) or []),
+                'Min': attribute['min'],
+                'Max': attribute['max'],
+            })
+        return pd.DataFrame(rows)
@@ -0,0 +1,215 @@
+"""
+Observation Store
+SQLite backend for the consolidated schema, keyed by GlobalID so new observations are upserted in place
+"""
+
+import sqlite3
+import logging
+import os
+
+import pandas as pd
+from dateutil.tz import tzlocal
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # Parquet export is optional
+    pa = None
+
+logger = logging.getLogger(__name__)
+
+TABLE = 'observations'
+
+# Dates are stored as UTC text in SQLite's own format, so range filters compare as strings
+DATE_FORMAT = '%Y-%m-%d %H:%M:%S'
+
+# Index name -> columns, created once all of its columns exist
+INDEXES = {
+    'idx_event': ['event'],
+    'idx_obs_date': ['_obs_date'],
+    'idx_location': ['_latitude', '_longitude'],
+    'idx_orig_location': ['_orig_lat', '_orig_lon'],
+}
+
+# Written on insert only, so a re-delivered observation keeps its first creation time
+INSERT_ONLY_COLUMNS = ['CreationDate']
+
+# Declared types of known columns, so they do not depend on the dtypes of the first batch stored
+COLUMN_TYPES = {
+    '_latitude': 'REAL',
+    '_longitude': 'REAL',
+    '_orig_lat': 'REAL',
+    '_orig_lon': 'REAL',
+    '_obs_date': 'TIMESTAMP',
+    'CreationDate': 'TIMESTAMP',
+    'EditDate': 'TIMESTAMP',
+}
+
+# SQLite types of esri schema field types; text and OBJECTID/GlobalID columns are left to inference
+ESRI_COLUMN_TYPES = {
+    'esriFieldTypeSmallInteger': 'INTEGER',
+    'esriFieldTypeInteger': 'INTEGER',
+    'esriFieldTypeSingle': 'REAL',
+    'esriFieldTypeDouble': 'REAL',
+    'esriFieldTypeDate': 'TIMESTAMP',
+}
+
+
+def utc_text(value):
+    """A date bound as stored UTC text; naive bounds are taken as UTC"""
+    value = pd.Timestamp(value)
+    value = value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')
+    return value.strftime(DATE_FORMAT)
+
+
+def quote(name):
+    """Quote a column name for SQL"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def column_type(series):
+    """SQLite column type for a pandas column"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        return 'TIMESTAMP'
+    if pd.api.types.is_bool_dtype(series) or pd.api.types.is_integer_dtype(series):
+        return 'INTEGER'
+    if pd.api.types.is_numeric_dtype(series):
+        return 'REAL'
+    return 'TEXT'
+
+
+def sql_values(series):
+    """Column values as Python objects for sqlite3, with NaN, NaT and '' stored as NULL"""
+    if pd.api.types.is_datetime64_any_dtype(series):
+        # Naive values such as the mapper's migration_time are local wall-clock times
+        if series.dt.tz is None:
+            series = series.dt.tz_localize(tzlocal(), ambiguous='NaT', nonexistent='shift_forward')
+        series = series.dt.tz_convert('UTC').dt.strftime(DATE_FORMAT)
+    values = series.astype(object)
+    return values.where(values.notna() & (values != ''), None).tolist()
+
+
+class ObservationStore:
+    """Mapped observations in one SQLite table with a stable OBJECTID per GlobalID"""
+
+    def __init__(self, db_file, column_types=None):
+        self.db_file = db_file
+        # Column name -> SQLite type used when the column is added, instead of inferring it
+        self.declared_types = {**COLUMN_TYPES, **(column_types or {})}
+        os.makedirs(os.path.dirname(os.path.abspath(db_file)), exist_ok=True)
+        self.connection = sqlite3.connect(db_file)
+        # WAL lets readers query the store while a response team appends to it
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        # AUTOINCREMENT never reuses an OBJECTID, even after deletes
+        self.connection.execute(f"CREATE TABLE IF NOT EXISTS {TABLE} ("
+                                f"OBJECTID INTEGER PRIMARY KEY AUTOINCREMENT, "
+                                f"GlobalID TEXT NOT NULL UNIQUE, event TEXT NOT NULL)")
+        self.connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """Close the database connection"""
+        self.connection.close()
+
+    def column_types(self):
+        """Stored column name -> declared type"""
+        return {row[1]: row[2] for row in self.connection.execute(f"PRAGMA table_info({TABLE})")}
+
+    def ensure_columns(self, df):
+        """Add columns the table does not have yet, then any indexes they complete"""
+        existing = self.column_types()
+        for col in df.columns:
+            if col not in existing:
+                sql_type = self.declared_types.get(col) or column_type(df[col])
+                self.connection.execute(f"ALTER TABLE {TABLE} ADD COLUMN {quote(col)} {sql_type}")
+                existing[col] = sql_type
+
+        for index_name, columns in INDEXES.items():
+            if all(col in existing for col in columns):
+                self.connection.execute(f"CREATE INDEX IF NOT EXISTS {index_name} ON {TABLE} "
+                                        f"({', '.join(quote(col) for col in columns)})")
+
+    def upsert(self, df, event):
+        """Insert or update mapped records by GlobalID in a single transaction"""
+        if df['GlobalID'].isna().any() or (df['GlobalID'] == '').any():
+            raise ValueError(f"{event} records without a GlobalID cannot be stored")
+
+        # The store owns OBJECTID; the frame's per-run numbering is dropped
+        df = df.drop(columns=['OBJECTID', 'event'], errors='ignore')
+        columns = ['event'] + list(df.columns)
+        updates = [col for col in columns if col not in ['GlobalID'] + INSERT_ONLY_COLUMNS]
+        statement = (f"INSERT INTO {TABLE} ({', '.join(quote(col) for col in columns)}) "
+                     f"VALUES ({', '.join('?' * len(columns))}) "
+                     f"ON CONFLICT(GlobalID) DO UPDATE SET "
+                     f"{', '.join(f'{quote(col)} = excluded.{quote(col)}' for col in updates)}")
+        rows = zip([event] * len(df), *(sql_values(df[col]) for col in df.columns))
+
+        with self.connection:
+            self.ensure_columns(df)
+            self.connection.executemany(statement, rows)
+        logger.info(f"Stored {len(df)} {event} records in {self.db_file}")
+        return len(df)
+
+    def query(self, events=None, start=None, end=None, bbox=None, global_ids=None, date_column='_obs_date'):
+        """WHERE clause and parameters for event, date range, bounding box and GlobalID filters"""
+        clauses, params = [], []
+        if global_ids is not None:
+            global_ids = list(global_ids)
+            clauses.append(f"GlobalID IN ({', '.join('?' * len(global_ids))})")
+            params.extend(global_ids)
+        if events:
+            clauses.append(f"event IN ({', '.join('?' * len(events))})")
+            params.extend(events)
+        if start is not None:
+            clauses.append(f"{quote(date_column)} >= ?")
+            params.append(utc_text(start))
+        if end is not None:
+            clauses.append(f"{quote(date_column)} < ?")
+            params.append(utc_text(end))
+        if bbox is not None:
+            min_lat, min_lon, max_lat, max_lon = bbox
+            # Stores whose coordinates were added as TEXT compare them as numbers, at the cost of the index
+            types = self.column_types()
+            lat, lon = (col if types.get(col) == 'REAL' else f"CAST({col} AS REAL)"
+                        for col in ('_latitude', '_longitude'))
+            clauses.append(f"{lat} BETWEEN ? AND ? AND {lon} BETWEEN ? AND ?")
+            params.extend(float(bound) for bound in (min_lat, max_lat, min_lon, max_lon))
+        return (' WHERE ' + ' AND '.join(clauses) if clauses else ''), params
+
+    def count(self, **filters):
+        """Number of stored records matching the filters accepted by read()"""
+        where, params = self.query(**filters)
+        return self.connection.execute(f"SELECT COUNT(*) FROM {TABLE}{where}", params).fetchone()[0]
+
+    def read(self, columns=None, events=None, start=None, end=None, bbox=None, global_ids=None):
+        """Stored records as a DataFrame ordered by OBJECTID, with dates parsed back to UTC timestamps"""
+        types = self.column_types()
+        columns = columns or list(types)
+        if 'OBJECTID' not in columns:
+            columns = ['OBJECTID'] + list(columns)
+        where, params = self.query(events, start, end, bbox, global_ids)
+        df = pd.read_sql_query(f"SELECT {', '.join(quote(col) for col in columns)} FROM {TABLE}{where} "
+                               f"ORDER BY OBJECTID", self.connection, params=params)
+        for col in df.columns:
+            if types.get(col) == 'TIMESTAMP':
+                df[col] = pd.to_datetime(df[col], format=DATE_FORMAT, utc=True)
+        return df
+
+    def export(self, file_path, **filters):
+        """Write stored records to CSV, or Parquet when file_path ends in .parquet"""
+        df = self.read(**filters)
+        if file_path.lower().endswith('.parquet'):
+            if pa is None:
+                logger.error("pyarrow is required for Parquet export")
+                return None
+            pq.write_table(pa.Table.from_pandas(df, preserve_index=False), file_path)
+        else:
+            df.to_csv(file_path, index=False)
+        logger.info(f"Exported {len(df)} records from {self.db_file} to {file_path}")
+        return file_path
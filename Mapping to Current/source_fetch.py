@@ -0,0 +1,198 @@
+"""
+ScienceBase Source Fetching
+Downloads source data and metadata into a local content-addressed cache with conditional revalidation
+"""
+
+import hashlib
+import json
+import logging
+import os
+import shutil
+import tempfile
+import time
+import urllib.error
+import urllib.request
+import zipfile
+from urllib.parse import quote, urlparse
+
+from metadata import file_content_hash
+
+logger = logging.getLogger(__name__)
+
+SCIENCEBASE_ITEM_URL = 'https://www.sciencebase.gov/catalog/item/'
+
+# ScienceBase release items of the registered events
+SCIENCEBASE_ITEMS = {
+    'Napa': '5c1a392de4b0708288c2e9a5',
+    'Ridgecrest': '5ef18f7f82ced62aaae19257',
+}
+
+CHUNK_SIZE = 1 << 20
+
+
+class FetchError(OSError):
+    """A source could not be downloaded and no cached copy is available"""
+
+
+class SourceFetcher:
+    """Fetch URLs into a cache of files named by their SHA-256, revalidating with ETag/Last-Modified"""
+
+    def __init__(self, cache_dir=None, offline=None, item_url=None, timeout=60):
+        # SCEC_FETCH_CACHE / SCEC_FETCH_OFFLINE let CI share a cache and forbid network access
+        self.cache_dir = cache_dir or os.environ.get('SCEC_FETCH_CACHE') or os.path.join(
+            os.path.dirname(os.path.abspath(__file__)), '.fetch_cache')
+        self.offline = offline if offline is not None else os.environ.get('SCEC_FETCH_OFFLINE') == '1'
+        self.item_url = item_url or SCIENCEBASE_ITEM_URL
+        self.timeout = timeout
+        self.index_file = os.path.join(self.cache_dir, 'index.json')
+
+    def load_index(self):
+        """URL -> cache entry (sha256, etag, last_modified, size, fetched)"""
+        try:
+            with open(self.index_file, encoding='utf-8') as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def save_index(self, index):
+        """Replace the index atomically so an interrupted run never leaves it half written"""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=self.cache_dir, suffix='.json')
+        with os.fdopen(fd, 'w', encoding='utf-8') as f:
+            json.dump(index, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.index_file)
+
+    def object_path(self, sha256, suffix=''):
+        """Location of a cached blob; the suffix keeps the file extension loaders dispatch on"""
+        return os.path.join(self.cache_dir, 'objects', sha256[:2], sha256 + suffix)
+
+    def cached_path(self, url):
+        """Cached file for a URL, or None"""
+        entry = self.load_index().get(url)
+        if entry and os.path.exists(self.object_path(entry['sha256'], entry['suffix'])):
+            return self.object_path(entry['sha256'], entry['suffix'])
+        return None
+
+    def fetch(self, url, max_age=0, suffix=None):
+        """Return a local path holding the content of url, downloading only when it changed"""
+        if suffix is None:
+            suffix = os.path.splitext(urlparse(url).path)[1]
+        index = self.load_index()
+        entry = index.get(url)
+        cached = self.object_path(entry['sha256'], entry['suffix']) if entry else None
+        if cached and not os.path.exists(cached):
+            entry, cached = None, None
+
+        if self.offline:
+            if cached is None:
+                raise FetchError(f"Offline and not cached: {url}")
+            return cached
+        if cached and max_age and time.time() - entry['fetched'] < max_age:
+            return cached
+
+        # Conditional request: the server answers 304 when the cached copy is current
+        request = urllib.request.Request(url)
+        if entry and entry.get('etag'):
+            request.add_header('If-None-Match', entry['etag'])
+        if entry and entry.get('last_modified'):
+            request.add_header('If-Modified-Since', entry['last_modified'])
+
+        try:
+            with urllib.request.urlopen(request, timeout=self.timeout) as response:
+                sha256, size = self.store_response(response, suffix)
+                headers = response.headers
+        except urllib.error.HTTPError as e:
+            if e.code == 304 and cached:
+                entry['fetched'] = time.time()
+                self.save_index(index)
+                logger.info(f"Not modified, using cached copy of {url}")
+                return cached
+            if cached:
+                logger.warning(f"HTTP {e.code} for {url}, using cached copy")
+                return cached
+            raise FetchError(f"HTTP {e.code} fetching {url}") from e
+        except (urllib.error.URLError, OSError) as e:
+            if cached:
+                logger.warning(f"Could not reach {url} ({e}), using cached copy")
+                return cached
+            raise FetchError(f"Could not fetch {url}: {e}") from e
+
+        index = self.load_index()
+        index[url] = {
+            'sha256': sha256,
+            'suffix': suffix,
+            'size': size,
+            'etag': headers.get('ETag'),
+            'last_modified': headers.get('Last-Modified'),
+            'fetched': time.time(),
+        }
+        self.save_index(index)
+        logger.info(f"Fetched {url} ({size} bytes)")
+        return self.object_path(sha256, suffix)
+
+    def store_response(self, response, suffix=''):
+        """Stream a response body to disk while hashing it, then move it to its content address"""
+        tmp_dir = os.path.join(self.cache_dir, 'tmp')
+        os.makedirs(tmp_dir, exist_ok=True)
+        digest = hashlib.sha256()
+        size = 0
+        fd, tmp_path = tempfile.mkstemp(dir=tmp_dir)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                for chunk in iter(lambda: response.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    f.write(chunk)
+                    size += len(chunk)
+            sha256 = digest.hexdigest()
+            target = self.object_path(sha256, suffix)
+            os.makedirs(os.path.dirname(target), exist_ok=True)
+            os.replace(tmp_path, target)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return sha256, size
+
+    def fetch_json(self, url, max_age=0):
+        """Fetch and parse a JSON document"""
+        with open(self.fetch(url, max_age), encoding='utf-8') as f:
+            return json.load(f)
+
+    def sciencebase_files(self, item_id, max_age=0):
+        """File name -> download URL for a ScienceBase item"""
+        item = self.fetch_json(f"{self.item_url}{quote(item_id)}?format=json", max_age)
+        return {file['name']: file['url'] for file in item.get('files', [])}
+
+    def fetch_sciencebase_file(self, item_id, file_name, max_age=0, files=None):
+        """Local path of one file attached to a ScienceBase item (files: a listing already fetched)"""
+        files = files or self.sciencebase_files(item_id, max_age)
+        if file_name not in files:
+            raise FetchError(f"{file_name} not found in ScienceBase item {item_id}")
+        return self.fetch(files[file_name], max_age, os.path.splitext(file_name)[1])
+
+    def extract_member(self, zip_path, suffix='.csv'):
+        """Extract the first archive member ending in suffix (skipping __MACOSX) once, and return its path"""
+        with zipfile.ZipFile(zip_path) as archive:
+            member = next((name for name in archive.namelist()
+                           if name.lower().endswith(suffix) and not name.startswith('__MACOSX')), None)
+            if member is None:
+                raise FetchError(f"No {suffix} member in {zip_path}")
+
+            # Cached blobs are already named by their hash; other archives are hashed here
+            objects_dir = os.path.join(os.path.abspath(self.cache_dir), 'objects')
+            if os.path.abspath(zip_path).startswith(objects_dir + os.sep):
+                archive_key = os.path.basename(zip_path)
+            else:
+                archive_key = file_content_hash(zip_path, CHUNK_SIZE)
+            # Only the member's file name is used, so names such as '../../x.csv' cannot leave the cache
+            extract_dir = os.path.join(self.cache_dir, 'extracted', archive_key)
+            target = os.path.join(extract_dir, os.path.basename(member.replace('\\', '/')))
+            if os.path.dirname(os.path.realpath(target)) != os.path.realpath(extract_dir):
+                raise FetchError(f"Unsafe archive member {member!r} in {zip_path}")
+            if not os.path.exists(target):
+                os.makedirs(os.path.dirname(target), exist_ok=True)
+                tmp_path = target + '.part'
+                with archive.open(member) as source, open(tmp_path, 'wb') as f:
+                    shutil.copyfileobj(source, f, CHUNK_SIZE)
+                os.replace(tmp_path, target)
+        return target
@@ -0,0 +1,155 @@
+"""
+Spatial Index for Mapped Earthquake Observations
+Grid index over observation coordinates supporting bbox, radius and k-nearest queries
+"""
+
+import numpy as np
+import pandas as pd
+import logging
+
+logger = logging.getLogger(__name__)
+
+EARTH_RADIUS_M = 6371008.8
+
+# Cell keys pack the row (latitude cell) in the high bits and the column (longitude cell) in the low bits
+CELL_OFFSET = 1 << 24
+ROW_STRIDE = 1 << 32
+
+
+def haversine_m(lat, lon, lat0, lon0):
+    """Great-circle distance in meters from (lat0, lon0) to arrays of points"""
+    lat, lon = np.radians(lat), np.radians(lon)
+    lat0, lon0 = np.radians(lat0), np.radians(lon0)
+    a = np.sin((lat - lat0) / 2) ** 2 + np.cos(lat) * np.cos(lat0) * np.sin((lon - lon0) / 2) ** 2
+    return 2 * EARTH_RADIUS_M * np.arcsin(np.sqrt(np.clip(a, 0, 1)))
+
+
+class ObservationSpatialIndex:
+    """Uniform lat/lon grid index returning OBJECTIDs for spatial queries"""
+
+    def __init__(self, cell_size_deg=0.01):
+        # 0.01 degrees is roughly 1.1 km north-south
+        self.cell_size_deg = cell_size_deg
+        self.keys = np.empty(0, dtype=np.int64)
+        self.object_ids = np.empty(0, dtype=np.int64)
+        self.lat = np.empty(0, dtype=np.float64)
+        self.lon = np.empty(0, dtype=np.float64)
+
+    def __len__(self):
+        return len(self.object_ids)
+
+    @classmethod
+    def from_frame(cls, df, cell_size_deg=0.01):
+        """Build an index from a mapped or consolidated dataset"""
+        index = cls(cell_size_deg)
+        index.add_records(df)
+        return index
+
+    def frame_coordinates(self, df):
+        """Extract OBJECTID and coordinates, falling back to original coordinates when missing"""
+        def column(name):
+            if name not in df.columns:
+                return pd.Series(np.nan, index=df.index)
+            return pd.to_numeric(df[name], errors='coerce')
+
+        lat = column('_latitude').fillna(column('_orig_lat')).to_numpy(dtype=np.float64)
+        lon = column('_longitude').fillna(column('_orig_lon')).to_numpy(dtype=np.float64)
+        object_ids = pd.to_numeric(df['OBJECTID'], errors='coerce').to_numpy(dtype=np.float64)
+
+        valid = ~(np.isnan(lat) | np.isnan(lon) | np.isnan(object_ids))
+        if not valid.all():
+            logger.warning(f"Skipping {int((~valid).sum())} records without coordinates")
+        return object_ids[valid].astype(np.int64), lat[valid], lon[valid]
+
+    def cell_rows_cols(self, lat, lon):
+        """Grid row and column of each point"""
+        rows = np.floor(np.asarray(lat) / self.cell_size_deg).astype(np.int64) + CELL_OFFSET
+        cols = np.floor(np.asarray(lon) / self.cell_size_deg).astype(np.int64) + CELL_OFFSET
+        return rows, cols
+
+    def add_records(self, df):
+        """Add new records to the index, replacing any with the same OBJECTID"""
+        object_ids, lat, lon = self.frame_coordinates(df)
+        if len(self.object_ids):
+            # Records delivered again without coordinates leave the index as well
+            replaced = pd.to_numeric(df['OBJECTID'], errors='coerce').dropna().to_numpy(dtype=np.int64)
+            keep = ~np.isin(self.object_ids, replaced)
+            self.keys, self.object_ids = self.keys[keep], self.object_ids[keep]
+            self.lat, self.lon = self.lat[keep], self.lon[keep]
+
+        rows, cols = self.cell_rows_cols(lat, lon)
+        keys = rows * ROW_STRIDE + cols
+
+        # Sort only the new records, then merge them into the sorted arrays
+        order = np.argsort(keys, kind='stable')
+        keys, object_ids, lat, lon = keys[order], object_ids[order], lat[order], lon[order]
+        positions = np.searchsorted(self.keys, keys, side='right')
+        self.keys = np.insert(self.keys, positions, keys)
+        self.object_ids = np.insert(self.object_ids, positions, object_ids)
+        self.lat = np.insert(self.lat, positions, lat)
+        self.lon = np.insert(self.lon, positions, lon)
+        logger.info(f"Spatial index: added {len(object_ids)} records ({len(self)} total)")
+
+    def candidates(self, min_lat, min_lon, max_lat, max_lon):
+        """Positions of all points in grid cells overlapping a bounding box"""
+        (row_min, row_max), (col_min, col_max) = self.cell_rows_cols([min_lat, max_lat], [min_lon, max_lon])
+        row_keys = np.arange(row_min, row_max + 1, dtype=np.int64) * ROW_STRIDE
+        starts = np.searchsorted(self.keys, row_keys + col_min, side='left')
+        ends = np.searchsorted(self.keys, row_keys + col_max, side='right')
+        spans = [np.arange(start, end) for start, end in zip(starts, ends) if end > start]
+        return np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+
+    def query_bbox(self, min_lat, min_lon, max_lat, max_lon):
+        """OBJECTIDs of observations inside a bounding box"""
+        positions = self.candidates(min_lat, min_lon, max_lat, max_lon)
+        lat, lon = self.lat[positions], self.lon[positions]
+        inside = (lat >= min_lat) & (lat <= max_lat) & (lon >= min_lon) & (lon <= max_lon)
+        return np.sort(self.object_ids[positions[inside]])
+
+    def radius_candidates(self, lat, lon, radius_m):
+        """Positions and distances of points within radius_m of a point"""
+        dlat = np.degrees(radius_m / EARTH_RADIUS_M)
+        dlon = np.degrees(radius_m / (EARTH_RADIUS_M * max(np.cos(np.radians(lat)), 1e-6)))
+        positions = self.candidates(lat - dlat, lon - dlon, lat + dlat, lon + dlon)
+        distances = haversine_m(self.lat[positions], self.lon[positions], lat, lon)
+        inside = distances <= radius_m
+        return positions[inside], distances[inside]
+
+    def query_radius(self, lat, lon, radius_m):
+        """OBJECTIDs of observations within radius_m meters of a point, nearest first"""
+        positions, distances = self.radius_candidates(lat, lon, radius_m)
+        order = np.argsort(distances, kind='stable')
+        return self.object_ids[positions[order]]
+
+    def query_nearest(self, lat, lon, k=1):
+        """OBJECTIDs of the k observations nearest to a point, nearest first"""
+        k = min(k, len(self))
+        if k == 0:
+            return np.empty(0, dtype=np.int64)
+
+        # Grow the search radius until it holds k points; anything outside is farther than all of them
+        radius_m = self.cell_size_deg * np.pi / 180 * EARTH_RADIUS_M
+        positions, distances = self.radius_candidates(lat, lon, radius_m)
+        while len(positions) < k and radius_m < np.pi * EARTH_RADIUS_M:
+            radius_m *= 2
+            positions, distances = self.radius_candidates(lat, lon, radius_m)
+
+        order = np.argsort(distances, kind='stable')[:k]
+        return self.object_ids[positions[order]]
+
+    def save(self, file_path):
+        """Persist the index as a compressed .npz file"""
+        np.savez_compressed(file_path, cell_size_deg=self.cell_size_deg, keys=self.keys,
+                            object_ids=self.object_ids, lat=self.lat, lon=self.lon)
+        logger.info(f"Spatial index saved to: {file_path}")
+
+    @classmethod
+    def load(cls, file_path):
+        """Load an index saved with save()"""
+        with np.load(file_path) as data:
+            index = cls(float(data['cell_size_deg']))
+            index.keys = data['keys']
+            index.object_ids = data['object_ids']
+            index.lat = data['lat']
+            index.lon = data['lon']
+        return index
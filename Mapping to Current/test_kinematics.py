@@ -0,0 +1,85 @@
+"""
+Tests for slip kinematics and circular statistics against hand-worked values
+Run with: python -m pytest "Mapping to Current"
+"""
+
+import numpy as np
+import pandas as pd
+
+from kinematics import circular_statistics, parse_measurements, slip_sense_signs
+from mapping import EarthquakeDataMapper
+
+
+def test_parse_measurements_reads_field_notation():
+    pref, low, high = parse_measurements(['>10.5', '<3', '13-19', '5*', '345**', 12, '', None, 'n/a'])
+
+    np.testing.assert_array_equal(pref, [np.nan, np.nan, 16, 5, 345, 12, np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(low, [10.5, 0, 13, 5, 345, 12, np.nan, np.nan, np.nan])
+    np.testing.assert_array_equal(high, [np.inf, 3, 19, 5, 345, 12, np.nan, np.nan, np.nan])
+
+
+def test_slip_sense_signs():
+    lateral, dip = slip_sense_signs(['Right-Normal', 'left lateral', 'Reverse', 'RL/Normal', None, 'unknown'])
+
+    np.testing.assert_array_equal(lateral, [-1, 1, 0, -1, np.nan, np.nan])
+    np.testing.assert_array_equal(dip, [-1, 0, 1, -1, np.nan, np.nan])
+
+
+def test_known_slip_kinematics():
+    df = pd.DataFrame({
+        'Slip_Sense': ['Right-Normal', 'Right', 'Normal', 'Right', '', ''],
+        'Horizontal_Separation_cm': ['30', '100', '', '>10.5', '', ''],
+        'Vertical_Separation_cm': ['40', '', '10', '', '', ''],
+        'Heave_cm': ['', '', '', '', '', ''],
+        'Local_Fault_Dip': ['90', '', '45', '', '', ''],
+        'Net_Slip_Preferred_cm': ['', '', '', '', '20', ''],
+        'Plunge': ['', '', '', '', '30', ''],
+    })
+    mapper = EarthquakeDataMapper()
+    kinematics = mapper.derive_kinematics(df)
+    columns = mapper.kinematic_columns
+
+    def derived(name):
+        return kinematics[columns[name]].to_numpy(dtype=float)
+
+    # Right-normal on a vertical fault: 30 cm right-lateral and 40 cm down give 50 cm of net slip
+    # raking down toward the right, between -90 (normal) and -180 (right-lateral)
+    np.testing.assert_allclose(derived('horizontal')[0], 30, atol=1e-9)
+    np.testing.assert_allclose(derived('vertical')[0], 40)
+    np.testing.assert_allclose(derived('net')[0], 50)
+    assert -180 < derived('rake')[0] < -90
+    np.testing.assert_allclose(derived('rake')[0], -180 + np.degrees(np.arctan2(40, 30)))
+
+    # Pure right-lateral and pure normal slip on a 45 degree fault
+    np.testing.assert_allclose(derived('rake')[1:3], [180, -90])
+    np.testing.assert_allclose(derived('net')[1:3], [100, 10 * np.sqrt(2)])
+    np.testing.assert_allclose(derived('horizontal')[2], 10)
+
+    # '>10.5' is a lower bound only: no preferred value and an open upper bound
+    assert np.isnan(derived('horizontal')[3]) and np.isnan(derived('net')[3])
+    np.testing.assert_allclose([derived('horizontal_min')[3], derived('net_min')[3]], [10.5, 10.5])
+    assert np.isnan(derived('horizontal_max')[3]) and np.isnan(derived('net_max')[3])
+
+    # Measured net slip and plunge give the components
+    np.testing.assert_allclose([derived('horizontal')[4], derived('vertical')[4], derived('net')[4]],
+                               [20 * np.cos(np.radians(30)), 10, 20])
+
+    # Nothing measured: no slip rather than zero slip
+    assert all(np.isnan(derived(name)[5]) for name in columns)
+
+
+def test_circular_statistics_wrap_through_north():
+    degrees = np.array([350, 10, 10, 190, 90, np.nan])
+    codes = np.array([0, 0, 1, 1, 2, 2])
+
+    directions = circular_statistics(degrees, codes, 3)
+    assert np.cos(np.radians(directions['mean_azimuth'][0])) > 1 - 1e-12
+    np.testing.assert_allclose(directions['resultant_length'][0], np.cos(np.radians(10)))
+    np.testing.assert_allclose(directions['resultant_length'][1], 0, atol=1e-12)
+    np.testing.assert_array_equal(directions['count'], [2, 2, 1])
+
+    # As lines, 10 and 190 are the same strike
+    lines = circular_statistics(degrees, codes, 3, axial=True)
+    np.testing.assert_allclose(lines['mean_azimuth'][1:], [10, 90])
+    np.testing.assert_allclose(lines['resultant_length'][1], 1)
+    np.testing.assert_allclose(lines['circular_std_deg'][1], 0, atol=1e-6)
@@ -0,0 +1,344 @@
+"""
+Tests for the earthquake observation mapping script
+Run with: python -m pytest "Mapping to Current"
+"""
+
+import json
+import os
+import shutil
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import mapping
+from mapping import EarthquakeDataMapper
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+NAPA_XLSX = os.path.join(MODULE_DIR, 'napa_observations.xlsx')
+NAPA_CSV = os.path.join(MODULE_DIR, 'napa_observations.csv')
+RIDGECREST_CSV = os.path.join(MODULE_DIR, 'ridgecrest_observations.csv')
+
+
+@pytest.fixture
+def excel_calls(monkeypatch):
+    """Count calls to the Excel parser while letting them through"""
+    calls = []
+    read_excel = pd.read_excel
+
+    def counting_read_excel(*args, **kwargs):
+        calls.append(args)
+        return read_excel(*args, **kwargs)
+
+    monkeypatch.setattr(mapping.pd, 'read_excel', counting_read_excel)
+    return calls
+
+
+@pytest.fixture
+def fake_excel(monkeypatch):
+    """Parse '.xlsx' files as plain text lines, so tests can change their bytes freely"""
+    calls = []
+
+    def read_lines(file_path, **kwargs):
+        calls.append(file_path)
+        with open(file_path, encoding='utf-8') as f:
+            return pd.DataFrame({'line': f.read().splitlines()})
+
+    monkeypatch.setattr(mapping.pd, 'read_excel', read_lines)
+    return calls
+
+
+def test_repeated_excel_loads_skip_parser(tmp_path, excel_calls):
+    source = tmp_path / 'napa_observations.xlsx'
+    shutil.copy(NAPA_XLSX, source)
+    mapper = EarthquakeDataMapper(cache_dir=str(tmp_path / 'cache'))
+
+    first = mapper.load_napa_data(str(source))
+    second = mapper.load_napa_data(str(source))
+    third = EarthquakeDataMapper(cache_dir=str(tmp_path / 'cache')).load_napa_data(str(source))
+
+    assert len(excel_calls) == 1
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first, third)
+
+
+def test_touched_source_reuses_cache(tmp_path, fake_excel):
+    source = tmp_path / 'observations.xlsx'
+    source.write_text('a\nb\n', encoding='utf-8')
+    mapper = EarthquakeDataMapper(cache_dir=str(tmp_path / 'cache'))
+    mapper.load_source_data(str(source), 'Test')
+
+    # Same content, new mtime: the hash confirms the entry is still valid
+    stat = os.stat(source)
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    mapper.load_source_data(str(source), 'Test')
+
+    assert len(fake_excel) == 1
+
+
+def test_cache_evicted_when_size_changes(tmp_path, fake_excel):
+    source = tmp_path / 'observations.xlsx'
+    source.write_text('a\nb\n', encoding='utf-8')
+    mapper = EarthquakeDataMapper(cache_dir=str(tmp_path / 'cache'))
+    mapper.load_source_data(str(source), 'Test')
+
+    source.write_text('a\nb\nc\n', encoding='utf-8')
+    df = mapper.load_source_data(str(source), 'Test')
+
+    assert len(fake_excel) == 2
+    assert df['line'].tolist() == ['a', 'b', 'c']
+    assert mapper.load_source_data(str(source), 'Test')['line'].tolist() == ['a', 'b', 'c']
+    assert len(fake_excel) == 2
+
+
+def test_cache_evicted_when_hash_changes(tmp_path, fake_excel):
+    source = tmp_path / 'observations.xlsx'
+    source.write_text('a\nb\n', encoding='utf-8')
+    mapper = EarthquakeDataMapper(cache_dir=str(tmp_path / 'cache'))
+    mapper.load_source_data(str(source), 'Test')
+
+    # Same size, different bytes and mtime
+    stat = os.stat(source)
+    source.write_text('a\nc\n', encoding='utf-8')
+    os.utime(source, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    df = mapper.load_source_data(str(source), 'Test')
+
+    assert len(fake_excel) == 2
+    assert df['line'].tolist() == ['a', 'c']
+
+
+def test_excel_dates_match_csv():
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    from_excel = mapper.map_napa_to_current(mapper.load_napa_data(NAPA_XLSX))
+    from_csv = mapper.map_napa_to_current(mapper.load_napa_data(NAPA_CSV))
+
+    assert from_excel['_obs_date'].notna().all()
+    pd.testing.assert_series_equal(from_excel['_obs_date'], from_csv['_obs_date'])
+    assert mapper.summarize_dates(from_excel)['_obs_date']['unparsed'] == 0
+
+
+def test_parse_dates_accepts_spreadsheet_values():
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    values = pd.Series(['2014:08:25 ', pd.Timestamp('2014-08-24 03:20'), pd.Timedelta(hours=2014, minutes=9, seconds=11),
+                        20140911, None, 'unknown'], dtype=object)
+
+    parsed = mapper.parse_dates(values, '%Y:%m:%d', 'America/Los_Angeles')
+
+    assert parsed.tolist()[:3] == [pd.Timestamp('2014-08-25 07:00', tz='UTC'),
+                                   pd.Timestamp('2014-08-24 10:20', tz='UTC'),
+                                   pd.Timestamp('2014-09-11 07:00', tz='UTC')]
+    assert parsed[3:].isna().all()
+
+    dates = pd.Series(pd.to_datetime(['2014-08-24 03:20', None]))
+    assert mapper.parse_dates(dates, '%Y:%m:%d', 'America/Los_Angeles')[0] == pd.Timestamp('2014-08-24 10:20', tz='UTC')
+    assert mapper.parse_dates(pd.Series([20140911.0]), '%Y%m%d')[0] == pd.Timestamp('2014-09-11', tz='UTC')
+
+
+def test_unparseable_dates_are_reported():
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    source_df = mapper.load_napa_data(NAPA_XLSX)
+    source_df['obs_date'] = source_df['obs_date'].astype(object)
+    source_df.loc[:1, 'obs_date'] = 'unknown'
+    current_df = mapper.map_napa_to_current(source_df)
+
+    summary = mapper.summarize_dates(current_df)['_obs_date']
+    assert summary['unparsed'] == 2
+    assert summary['unparsed_examples'] == ['unknown']
+
+
+def test_typed_streaming_writes_same_columns_in_every_chunk(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    mapper = EarthquakeDataMapper(typed_schema=True, use_source_cache=False)
+    mapper.set_event_source('Napa', NAPA_CSV)
+    mapper.stream_migration('test', chunksize=100)
+
+    streamed = pd.read_csv(tmp_path / 'napa_current_schema_test.csv', low_memory=False)
+    consolidated = pd.read_csv(tmp_path / 'consolidated_earthquake_observations_test.csv', low_memory=False)
+    expected = mapper.finalize_single_dataset(mapper.map_napa_to_current(mapper.load_napa_data(NAPA_CSV)))
+
+    assert list(streamed.columns) == list(expected.columns)
+    for col in [col for col in expected.columns if col.endswith('_orig') and col != '_obs_date_orig']:
+        assert streamed[col].astype(object).where(streamed[col].notna(), None).tolist() == \
+            expected[col].astype(object).where(expected[col].notna(), None).tolist(), col
+
+    kinematics = mapper.derive_kinematics(expected.copy())
+    for col in mapper.kinematic_columns.values():
+        np.testing.assert_allclose(consolidated[col], kinematics[col].astype(float), rtol=1e-5, err_msg=col)
+
+
+def observations(**columns):
+    """A small consolidated frame of Ridgecrest-style records at one point"""
+    n_rows = len(columns['_obs_date'])
+    df = pd.DataFrame({
+        'OBJECTID': np.arange(1, n_rows + 1),
+        'GlobalID': [f"{{{i}}}" for i in range(n_rows)],
+        'Station_ID': np.arange(10, 10 + n_rows),
+        '_latitude': np.full(n_rows, 35.7),
+        '_longitude': np.full(n_rows, -117.5),
+        'Date_of_Movement': '',
+        'Horizontal_Separation_cm': np.full(n_rows, 120.0),
+        'Vertical_Separation_cm': np.full(n_rows, 15.0),
+    })
+    for col, values in columns.items():
+        df[col] = values
+    df['_obs_date'] = pd.to_datetime(df['_obs_date'], utc=True)
+    return df
+
+
+def test_flag_exact_duplicates():
+    df = observations(_obs_date=['2019-07-06 18:00'] * 3, Station_ID=[10, 10, 11],
+                      Horizontal_Separation_cm=[120, 120, 300])
+    flagged = EarthquakeDataMapper().flag_duplicates(df)
+
+    # Only OBJECTID and GlobalID differ between the first two records
+    assert flagged['_duplicate_type'].tolist() == ['', 'exact', '']
+    assert flagged['_duplicate_of'].tolist()[1] == 1
+
+
+def test_flag_near_duplicate_reported_under_other_origid():
+    metre = 1 / 111320
+    df = observations(_obs_date=['2019-07-06 18:00', '2019-07-06 23:00', '2019-07-08 18:00', '2019-07-06 19:00',
+                                 '2019-07-06 20:00'],
+                      _latitude=[35.7, 35.7 + 0.3 * metre, 35.7, 35.7, 35.7 + 5 * metre],
+                      Horizontal_Separation_cm=[120, 120.3, 120, 150, 120])
+    flagged = EarthquakeDataMapper().flag_duplicates(df)
+
+    # Re-reported by another team (new Station_ID) 0.3 m away the same day; not another day, other
+    # offsets or 5 m away
+    assert flagged['_duplicate_type'].tolist() == ['', 'near', '', '', '']
+    assert flagged['_duplicate_of'].tolist()[1] == 1
+
+
+def test_near_duplicates_fall_back_to_date_of_movement():
+    df = observations(_obs_date=[None, None, None], Date_of_Movement=['2019-07-10', '2019-07-10', '2019-07-11'])
+    flagged = EarthquakeDataMapper().flag_duplicates(df)
+
+    assert flagged['_duplicate_type'].tolist() == ['', 'near', '']
+
+
+def test_typed_duplicate_references_are_integers():
+    mapper = EarthquakeDataMapper(typed_schema=True)
+    df = observations(_obs_date=['2019-07-06 18:00'] * 2)
+    typed = mapper.apply_schema_types(mapper.flag_duplicates(df))
+
+    assert str(typed['_duplicate_of'].dtype) == 'Int32'
+    assert typed['_duplicate_of'].tolist()[1] == 1
+
+
+def test_violation_bits_follow_rule_order():
+    mapper = EarthquakeDataMapper()
+    rules = mapper.get_measurement_rules()
+    bits = {rule['name']: bit for bit, rule in enumerate(rules)}
+    df = pd.DataFrame({
+        'Local_Fault_Dip': [45, 45, 95, ''],
+        '_fault_dip_min': [30, 50, '', ''],
+        '_fault_dip_max': [60, 60, '', '>10.5'],
+    })
+
+    mask = mapper.validate_measurements(df)
+
+    assert mask.tolist() == [0, 1 << bits['fault_dip min <= pref <= max'], 1 << bits['fault_dip in 0-90'], 0]
+    summary = mapper.summarize_measurement_violations(df.assign(_range_violations=mask))
+    assert summary == {'rows': 2, 'rules': {'fault_dip min <= pref <= max': 1, 'fault_dip in 0-90': 1}}
+
+
+def test_azimuth_order_wraps_through_north():
+    mapper = EarthquakeDataMapper()
+    rules = [rule for rule in mapper.get_measurement_rules() if rule['name'].startswith('horiz_az ')]
+    df = pd.DataFrame({
+        '_horiz_az_min': [350, 350, 10, 10],
+        'Slip_Azimuth': [5, 180, 20, 350],
+        '_horiz_az_max': [20, 20, 30, 30],
+    })
+
+    # Bit 0 is the circular order rule of the two horiz_az rules
+    assert rules[0]['circular']
+    assert mapper.validate_measurements(df, rules).tolist() == [0, 1, 0, 1]
+
+
+def test_consolidated_masks_match_revalidation():
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    napa = mapper.map_napa_to_current(mapper.load_napa_data(NAPA_CSV))
+    ridgecrest = mapper.map_ridgecrest_to_current(mapper.load_ridgecrest_data(RIDGECREST_CSV))
+    consolidated = mapper.consolidate_events([mapper.finalize_single_dataset(napa),
+                                              mapper.finalize_single_dataset(ridgecrest)])
+
+    # Napa has no aperture columns, yet its masks use the same bits as Ridgecrest's
+    assert mapper.summarize_measurement_violations(consolidated)['rows'] > 0
+    np.testing.assert_array_equal(consolidated[mapper.violation_column].to_numpy(dtype=np.uint64),
+                                  mapper.validate_measurements(consolidated).astype(np.uint64))
+
+
+def csv_values(csv_file):
+    """CSV cells as text, with numbers written the same way whichever way the source wrote them"""
+    df = pd.read_csv(csv_file, dtype=str, keep_default_na=False)
+    for col in df.columns:
+        numbers = pd.to_numeric(df[col], errors='coerce')
+        df[col] = df[col].where(numbers.isna(), numbers.map(lambda value: f"{value:.6g}"))
+    return df
+
+
+def test_streaming_matches_in_memory_across_chunks(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    mapper.set_event_source('Napa', NAPA_CSV)
+    mapper.set_event_source('Ridgecrest', RIDGECREST_CSV)
+
+    # 1222 and 1130 records: neither event ends on a chunk boundary
+    assert mapper.stream_migration('test', chunksize=100) == {'Napa': 1222, 'Ridgecrest': 1130}
+
+    results = mapper.run_pipeline(processes=1)
+    for name, result in results.items():
+        result['current'].to_csv(tmp_path / f"expected_{name}.csv", index=False)
+        # Streamed values keep their source text ('90' rather than '90.0')
+        pd.testing.assert_frame_equal(csv_values(tmp_path / f"{name.lower()}_current_schema_test.csv"),
+                                      csv_values(tmp_path / f"expected_{name}.csv"))
+
+    mapper.consolidate_events([result['current'] for result in results.values()]).to_csv(
+        tmp_path / 'expected_consolidated.csv', index=False)
+    streamed = csv_values(tmp_path / 'consolidated_earthquake_observations_test.csv')
+    assert streamed['OBJECTID'].tolist() == [str(objectid) for objectid in range(1, 1222 + 1130 + 1)]
+    pd.testing.assert_frame_equal(streamed, csv_values(tmp_path / 'expected_consolidated.csv'))
+
+
+def incremental_mapper(sources):
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    for name, source in sources.items():
+        mapper.set_event_source(name, str(source))
+    return mapper
+
+
+def test_incremental_migration_remaps_only_changed_events(tmp_path):
+    sources = {'Napa': tmp_path / 'napa.csv', 'Ridgecrest': tmp_path / 'ridgecrest.csv'}
+    shutil.copy(NAPA_CSV, sources['Napa'])
+    shutil.copy(RIDGECREST_CSV, sources['Ridgecrest'])
+    cache_dir = str(tmp_path / 'cache')
+
+    first = incremental_mapper(sources).migrate_incremental(cache_dir, processes=1)
+    assert [result['input_records'] for result in first.values()] == [1222, 1130]
+
+    # Unchanged inputs: nothing is remapped and the output, timestamps included, is identical
+    second = incremental_mapper(sources).migrate_incremental(cache_dir, processes=1)
+    assert [result['input_records'] for result in second.values()] == [None, None]
+    for name in sources:
+        pd.testing.assert_frame_equal(second[name]['current'], first[name]['current'])
+
+    # Drop Ridgecrest's last record; only Ridgecrest is remapped
+    ridgecrest = pd.read_csv(sources['Ridgecrest'], dtype=str, keep_default_na=False)
+    ridgecrest.iloc[:-1].to_csv(sources['Ridgecrest'], index=False)
+    third = incremental_mapper(sources).migrate_incremental(cache_dir, processes=1)
+    assert third['Napa']['input_records'] is None
+    assert third['Ridgecrest']['input_records'] == 1129
+    pd.testing.assert_frame_equal(third['Napa']['current'], first['Napa']['current'])
+    remapped = third['Ridgecrest']['current'].drop(columns=['CreationDate', 'EditDate'])
+    pd.testing.assert_frame_equal(remapped, first['Ridgecrest']['current'].iloc[:-1].drop(columns=['CreationDate', 'EditDate']))
+
+    # A mapping change remaps the event even though its source is unchanged
+    mapper = incremental_mapper(sources)
+    mapper.events['Napa']['mapping'] = dict(mapper.events['Napa']['mapping'], intid='Station_ID')
+    fourth = mapper.migrate_incremental(cache_dir, processes=1)
+    assert [result['input_records'] for result in fourth.values()] == [1222, None]
+
+    with open(os.path.join(cache_dir, 'migration_manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    assert {name: entry['records'] for name, entry in manifest['events'].items()} == {'Napa': 1222, 'Ridgecrest': 1129}
@@ -0,0 +1,82 @@
+"""
+Tests for the compiled FGDC metadata schema cache
+Run with: python -m pytest "Mapping to Current"
+"""
+
+import os
+import shutil
+
+import pytest
+
+import metadata
+from metadata import AttributeSchema
+
+OBSERVATIONS_XML = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'Observations.xml')
+
+
+@pytest.fixture
+def calls(monkeypatch):
+    """Count XML hashes and parses while letting them through"""
+    calls = {'hash': 0, 'parse': 0}
+    file_content_hash = metadata.file_content_hash
+    from_xml = AttributeSchema.from_xml.__func__
+
+    def counting_hash(*args, **kwargs):
+        calls['hash'] += 1
+        return file_content_hash(*args, **kwargs)
+
+    def counting_from_xml(cls, *args, **kwargs):
+        calls['parse'] += 1
+        return from_xml(cls, *args, **kwargs)
+
+    monkeypatch.setattr(metadata, 'file_content_hash', counting_hash)
+    monkeypatch.setattr(AttributeSchema, 'from_xml', classmethod(counting_from_xml))
+    return calls
+
+
+@pytest.fixture
+def xml_file(tmp_path):
+    xml_file = tmp_path / 'Observations.xml'
+    shutil.copy(OBSERVATIONS_XML, xml_file)
+    return xml_file
+
+
+def test_unchanged_metadata_is_not_read(xml_file, tmp_path, calls):
+    cache_file = str(tmp_path / 'schema.json')
+    first = AttributeSchema.load(str(xml_file), cache_file)
+    calls.update(hash=0, parse=0)
+
+    second = AttributeSchema.load(str(xml_file), cache_file)
+
+    assert calls == {'hash': 0, 'parse': 0}
+    assert second.attributes == first.attributes
+    assert second.sha256 == first.sha256
+
+
+def test_touched_metadata_is_hashed_once(xml_file, tmp_path, calls):
+    cache_file = str(tmp_path / 'schema.json')
+    AttributeSchema.load(str(xml_file), cache_file)
+    calls.update(hash=0, parse=0)
+
+    stat = os.stat(xml_file)
+    os.utime(xml_file, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+    AttributeSchema.load(str(xml_file), cache_file)
+    assert calls == {'hash': 1, 'parse': 0}
+
+    # The new modification time was recorded, so the next load is a fast hit again
+    AttributeSchema.load(str(xml_file), cache_file)
+    assert calls == {'hash': 1, 'parse': 0}
+
+
+def test_changed_metadata_is_recompiled(xml_file, tmp_path, calls):
+    cache_file = str(tmp_path / 'schema.json')
+    first = AttributeSchema.load(str(xml_file), cache_file)
+    calls.update(hash=0, parse=0)
+
+    xml_file.write_bytes(xml_file.read_bytes().replace(b'<attrlabl>', b'<attrlabl>x_', 1))
+    schema = AttributeSchema.load(str(xml_file), cache_file)
+
+    assert calls['parse'] == 1
+    assert schema.sha256 != first.sha256
+    assert len(schema) == len(first)
+    assert set(schema.attributes) != set(first.attributes)
@@ -0,0 +1,92 @@
+"""
+Tests for the SQLite observation store
+Run with: python -m pytest "Mapping to Current"
+"""
+
+import os
+import time
+
+import pandas as pd
+import pytest
+
+from mapping import EarthquakeDataMapper
+from observation_store import ObservationStore, TABLE
+
+NAPA_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'napa_observations.csv')
+
+
+def records(global_ids, latitudes, longitudes, dates=None):
+    """A minimal mapped frame"""
+    return pd.DataFrame({
+        'OBJECTID': range(1, len(global_ids) + 1),
+        'GlobalID': global_ids,
+        '_latitude': latitudes,
+        '_longitude': longitudes,
+        '_obs_date': pd.to_datetime(dates or [None] * len(global_ids), utc=True),
+    })
+
+
+def test_coordinate_types_do_not_depend_on_first_batch(tmp_path):
+    with ObservationStore(str(tmp_path / 'store.sqlite')) as store:
+        # A first batch without coordinates has object columns that would be inferred as TEXT
+        store.upsert(records(['{A}'], [''], ['']).astype({'_latitude': object, '_longitude': object}), 'Napa')
+        store.upsert(records(['{B}', '{C}'], ['38.25', 35.7], ['-122.31', -117.5]), 'Napa')
+
+        types = store.column_types()
+        assert types['_latitude'] == types['_longitude'] == 'REAL'
+        assert types['_obs_date'] == 'TIMESTAMP'
+        assert store.count(bbox=(38, -123, 39, -122)) == 1
+        assert store.count(bbox=(35, -118, 39, -117)) == 1
+        assert store.read(bbox=(35, -123, 39, -117))['GlobalID'].tolist() == ['{B}', '{C}']
+
+
+def test_bbox_casts_coordinates_of_existing_text_columns(tmp_path):
+    db_file = str(tmp_path / 'store.sqlite')
+    with ObservationStore(db_file) as store:
+        # A store created before coordinate types were declared
+        store.connection.execute(f"ALTER TABLE {TABLE} ADD COLUMN _latitude TEXT")
+        store.connection.execute(f"ALTER TABLE {TABLE} ADD COLUMN _longitude TEXT")
+        store.upsert(records(['{A}', '{B}'], ['38.25', '9.5'], ['-122.31', '-117.5']), 'Napa')
+
+        assert store.column_types()['_latitude'] == 'TEXT'
+        assert store.count(bbox=(38, -123, 39, -122)) == 1
+        assert store.count(bbox=('9', '-118', '10', '-117')) == 1
+
+
+def test_mapper_declares_numeric_schema_columns(tmp_path):
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    current_df = mapper.finalize_single_dataset(mapper.map_napa_to_current(mapper.load_napa_data(NAPA_CSV)))
+
+    with ObservationStore(str(tmp_path / 'store.sqlite'), mapper.store_column_types()) as store:
+        store.upsert(current_df, 'Napa')
+        types = store.column_types()
+
+        assert types['Heave_cm'] == types['_orig_lat'] == 'REAL'
+        assert types['Plunge'] == 'INTEGER'
+        assert types['_obs_date'] == 'TIMESTAMP'
+        heave = store.connection.execute(f"SELECT typeof(Heave_cm), COUNT(*) FROM {TABLE} GROUP BY 1").fetchall()
+        assert ('real', int(pd.to_numeric(current_df['Heave_cm'], errors='coerce').notna().sum())) in heave
+
+
+@pytest.fixture
+def pacific_time(monkeypatch):
+    """Run with the machine's local timezone set to US Pacific"""
+    monkeypatch.setenv('TZ', 'America/Los_Angeles')
+    time.tzset()
+    yield
+    monkeypatch.undo()
+    time.tzset()
+
+
+def test_naive_migration_times_are_stored_as_utc(tmp_path, pacific_time):
+    df = records(['{A}', '{B}'], [35.7, 35.8], [-117.5, -117.6])
+    df['CreationDate'] = pd.Timestamp('2026-10-17 06:00:00')
+    df['EditDate'] = pd.Timestamp('2026-01-15 06:00:00')
+
+    with ObservationStore(str(tmp_path / 'store.sqlite')) as store:
+        store.upsert(df, 'Napa')
+        stored = store.read()
+
+    # PDT is UTC-7 and PST UTC-8
+    assert stored['CreationDate'].tolist() == [pd.Timestamp('2026-10-17 13:00', tz='UTC')] * 2
+    assert stored['EditDate'].tolist() == [pd.Timestamp('2026-01-15 14:00', tz='UTC')] * 2
@@ -0,0 +1,128 @@
+"""
+Tests for the ScienceBase fetch cache against a local HTTP server
+Run with: python -m pytest "Mapping to Current"
+"""
+
+import functools
+import http.server
+import os
+import threading
+import zipfile
+
+import pytest
+
+from source_fetch import SourceFetcher, FetchError
+
+
+class RecordingHandler(http.server.SimpleHTTPRequestHandler):
+    """Serve files from a directory, recording the status of every response"""
+
+    def send_response(self, code, message=None):
+        self.server.statuses.append(code)
+        super().send_response(code, message)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def server(tmp_path):
+    """A local stand-in for ScienceBase serving tmp_path/www; honours If-Modified-Since"""
+    root = tmp_path / 'www'
+    root.mkdir()
+    httpd = http.server.ThreadingHTTPServer(('127.0.0.1', 0),
+                                            functools.partial(RecordingHandler, directory=str(root)))
+    httpd.statuses = []
+    httpd.root = root
+    httpd.url = f"http://127.0.0.1:{httpd.server_address[1]}/"
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield httpd
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_download_then_not_modified(server, tmp_path):
+    (server.root / 'observations.csv').write_text('a,b\n1,2\n', encoding='utf-8')
+    fetcher = SourceFetcher(cache_dir=str(tmp_path / 'cache'), offline=False, timeout=5)
+
+    first = fetcher.fetch(server.url + 'observations.csv')
+    second = fetcher.fetch(server.url + 'observations.csv')
+
+    assert server.statuses == [200, 304]
+    assert first == second
+    assert first.endswith('.csv')
+    with open(first, encoding='utf-8') as f:
+        assert f.read() == 'a,b\n1,2\n'
+
+
+def test_changed_source_is_downloaded_again(server, tmp_path):
+    source = server.root / 'observations.csv'
+    source.write_text('a,b\n1,2\n', encoding='utf-8')
+    fetcher = SourceFetcher(cache_dir=str(tmp_path / 'cache'), offline=False, timeout=5)
+    first = fetcher.fetch(server.url + 'observations.csv')
+
+    source.write_text('a,b\n3,4\n', encoding='utf-8')
+    stat = os.stat(source)
+    os.utime(source, (stat.st_atime + 10, stat.st_mtime + 10))
+    second = fetcher.fetch(server.url + 'observations.csv')
+
+    assert server.statuses == [200, 200]
+    assert second != first
+    with open(second, encoding='utf-8') as f:
+        assert f.read() == 'a,b\n3,4\n'
+
+
+def test_max_age_skips_revalidation(server, tmp_path):
+    (server.root / 'observations.csv').write_text('a\n1\n', encoding='utf-8')
+    fetcher = SourceFetcher(cache_dir=str(tmp_path / 'cache'), offline=False, timeout=5)
+
+    fetcher.fetch(server.url + 'observations.csv', max_age=3600)
+    fetcher.fetch(server.url + 'observations.csv', max_age=3600)
+
+    assert server.statuses == [200]
+
+
+def test_unreachable_server_falls_back_to_cache(server, tmp_path):
+    (server.root / 'observations.csv').write_text('a\n1\n', encoding='utf-8')
+    fetcher = SourceFetcher(cache_dir=str(tmp_path / 'cache'), offline=False, timeout=5)
+    cached = fetcher.fetch(server.url + 'observations.csv')
+
+    server.shutdown()
+    server.server_close()
+
+    assert fetcher.fetch(server.url + 'observations.csv') == cached
+    with pytest.raises(FetchError):
+        fetcher.fetch(server.url + 'other.csv')
+
+
+def test_offline_uses_cache_without_requests(server, tmp_path):
+    (server.root / 'observations.csv').write_text('a\n1\n', encoding='utf-8')
+    cache_dir = str(tmp_path / 'cache')
+    cached = SourceFetcher(cache_dir=cache_dir, offline=False, timeout=5).fetch(server.url + 'observations.csv')
+    server.statuses.clear()
+
+    offline = SourceFetcher(cache_dir=cache_dir, offline=True)
+    assert offline.fetch(server.url + 'observations.csv') == cached
+    with pytest.raises(FetchError):
+        offline.fetch(server.url + 'other.csv')
+    assert server.statuses == []
+
+
+def test_extract_member_stays_inside_cache(tmp_path):
+    zip_path = tmp_path / 'incoming' / 'release.zip'
+    zip_path.parent.mkdir()
+    with zipfile.ZipFile(zip_path, 'w') as archive:
+        archive.writestr('__MACOSX/._escaped.csv', 'ignored')
+        archive.writestr('../../../escaped.csv', 'a\n1\n')
+    cache_dir = tmp_path / 'deep' / 'cache'
+    fetcher = SourceFetcher(cache_dir=str(cache_dir), offline=True)
+
+    target = fetcher.extract_member(str(zip_path))
+
+    assert os.path.realpath(target).startswith(os.path.realpath(cache_dir / 'extracted') + os.sep)
+    assert os.path.basename(target) == 'escaped.csv'
+    assert not any(path.name == 'escaped.csv' for path in tmp_path.rglob('*') if 'extracted' not in path.parts)
+    with open(target, encoding='utf-8') as f:
+        assert f.read() == 'a\n1\n'
+    assert fetcher.extract_member(str(zip_path)) == target
@@ -0,0 +1,98 @@
+"""
+Tests for the grid spatial index against brute-force scans
+Run with: python -m pytest "Mapping to Current"
+"""
+
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapping import EarthquakeDataMapper
+from observation_store import ObservationStore
+from spatial_index import ObservationSpatialIndex, haversine_m
+
+NAPA_CSV = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'napa_observations.csv')
+
+
+@pytest.fixture
+def points():
+    """Clustered points around a rupture, with a few records lacking coordinates"""
+    rng = np.random.default_rng(7)
+    n_rows = 2000
+    lat = 35.7 + rng.normal(0, 0.05, n_rows)
+    lon = -117.5 + rng.normal(0, 0.05, n_rows)
+    lat[::97] = np.nan
+    return pd.DataFrame({'OBJECTID': rng.permutation(n_rows) + 1, '_latitude': lat, '_longitude': lon})
+
+
+def brute_force_distances(points, lat, lon):
+    located = points.dropna(subset=['_latitude', '_longitude'])
+    distances = haversine_m(located['_latitude'].to_numpy(), located['_longitude'].to_numpy(), lat, lon)
+    return located['OBJECTID'].to_numpy(), distances
+
+
+def test_bbox_matches_scan(points):
+    index = ObservationSpatialIndex.from_frame(points)
+    for min_lat, min_lon, max_lat, max_lon in [(35.68, -117.53, 35.71, -117.49), (35.0, -118.0, 36.0, -117.0),
+                                               (35.7, -117.5, 35.7001, -117.4999), (40.0, -120.0, 41.0, -119.0)]:
+        inside = points[points['_latitude'].between(min_lat, max_lat) & points['_longitude'].between(min_lon, max_lon)]
+        assert index.query_bbox(min_lat, min_lon, max_lat, max_lon).tolist() == sorted(inside['OBJECTID'])
+
+
+def test_radius_matches_scan(points):
+    index = ObservationSpatialIndex.from_frame(points)
+    for lat, lon, radius_m in [(35.7, -117.5, 500), (35.72, -117.45, 3000), (35.6, -117.6, 15000), (0, 0, 1000)]:
+        object_ids, distances = brute_force_distances(points, lat, lon)
+        order = np.argsort(distances, kind='stable')
+        expected = object_ids[order][distances[order] <= radius_m]
+        assert index.query_radius(lat, lon, radius_m).tolist() == expected.tolist()
+
+
+def test_nearest_matches_scan(points):
+    index = ObservationSpatialIndex.from_frame(points)
+    for lat, lon, k in [(35.7, -117.5, 1), (35.75, -117.42, 10), (36.5, -118.5, 25), (35.7, -117.5, 5000)]:
+        object_ids, distances = brute_force_distances(points, lat, lon)
+        expected = np.sort(distances)[:k]
+        found = index.query_nearest(lat, lon, k)
+        found_distances = haversine_m(index.lat[np.isin(index.object_ids, found)],
+                                      index.lon[np.isin(index.object_ids, found)], lat, lon)
+        assert len(found) == min(k, len(object_ids))
+        np.testing.assert_allclose(np.sort(found_distances), expected)
+
+
+def test_incremental_add_and_reload_match_full_build(points, tmp_path):
+    full = ObservationSpatialIndex.from_frame(points)
+    index = ObservationSpatialIndex.from_frame(points.iloc[:1200])
+    moved = points.iloc[:100].assign(_latitude=36.5, _longitude=-118.5)
+    index.add_records(moved)
+    index.add_records(points.iloc[1200:])
+    index.add_records(points.iloc[:100])
+
+    index.save(str(tmp_path / 'spatial.npz'))
+    reloaded = ObservationSpatialIndex.load(str(tmp_path / 'spatial.npz'))
+    for query in [(35.68, -117.53, 35.71, -117.49), (36.4, -118.6, 36.6, -118.4)]:
+        assert reloaded.query_bbox(*query).tolist() == full.query_bbox(*query).tolist()
+    assert len(reloaded) == len(full)
+
+
+def test_appended_observations_are_indexed_by_store_objectid(tmp_path):
+    mapper = EarthquakeDataMapper(use_source_cache=False)
+    source_df = mapper.load_napa_data(NAPA_CSV)
+    with ObservationStore(str(tmp_path / 'store.sqlite'), mapper.store_column_types()) as store:
+        mapper.append_observations('Napa', source_df.iloc[:1000], store)
+        index = mapper.build_spatial_index(store.read())
+
+        # Newly received records, plus records delivered again
+        mapper.append_observations('Napa', source_df.iloc[900:], store, spatial_index=index)
+
+        stored = store.read()
+        assert len(index) == len(mapper.build_spatial_index(stored))
+        record = stored.dropna(subset=['_latitude', '_longitude']).iloc[-1]
+        nearest = index.query_nearest(record['_latitude'], record['_longitude'], 1)
+        nearby = stored.loc[stored['OBJECTID'].isin(nearest)]
+        assert np.allclose(nearby[['_latitude', '_longitude']].to_numpy(dtype=float),
+                           [[record['_latitude'], record['_longitude']]])
+        assert sorted(index.object_ids.tolist()) == sorted(
+            stored.dropna(subset=['_latitude', '_longitude'])['OBJECTID'].tolist())
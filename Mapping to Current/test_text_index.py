@@ -0,0 +1,109 @@
+"""
+Tests for the full-text index against regex scans of the mapped observations
+Run with: python -m pytest "Mapping to Current"
+"""
+
+import os
+import re
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from mapping import EarthquakeDataMapper
+from text_index import ObservationTextIndex, SOURCE_PREFIX, TEXT_FIELDS
+
+MODULE_DIR = os.path.dirname(os.path.abspath(__file__))
+NAPA_CSV = os.path.join(MODULE_DIR, 'napa_observations.csv')
+RIDGECREST_CSV = os.path.join(MODULE_DIR, 'ridgecrest_observations.csv')
+
+
+@pytest.fixture(scope='module')
+def mapper():
+    return EarthquakeDataMapper(use_source_cache=False)
+
+
+@pytest.fixture(scope='module')
+def consolidated(mapper):
+    napa = mapper.map_napa_to_current(mapper.load_napa_data(NAPA_CSV))
+    ridgecrest = mapper.map_ridgecrest_to_current(mapper.load_ridgecrest_data(RIDGECREST_CSV))
+    return mapper.consolidate_events([mapper.finalize_single_dataset(napa), mapper.finalize_single_dataset(ridgecrest)])
+
+
+def scan(df, events, pattern, event=None, start=None, end=None):
+    """OBJECTIDs of records where any indexed field matches pattern, by a full regex scan"""
+    found = np.zeros(len(df), dtype=bool)
+    for field in TEXT_FIELDS:
+        text = df[field].astype(str).str.lower()
+        if field == 'Notes':
+            text = text.str.replace(SOURCE_PREFIX, '', regex=True)
+        found |= text.str.contains(pattern, regex=True).to_numpy()
+    if event:
+        found &= events == event
+    dates = df['_obs_date']
+    if start is not None:
+        found &= (dates >= pd.Timestamp(start, tz='UTC')).to_numpy()
+    if end is not None:
+        found &= (dates < pd.Timestamp(end, tz='UTC')).to_numpy()
+    return sorted(df.loc[found, 'OBJECTID'])
+
+
+def words(*tokens, prefix=False):
+    """Regex for consecutive tokens, as the index tokenizes text"""
+    body = r'[^a-z0-9]+'.join(re.escape(token) for token in tokens)
+    return r'(?<![a-z0-9])' + body + ('' if prefix else r'(?![a-z0-9])')
+
+
+@pytest.mark.parametrize('query, pattern', [
+    ('pebble', words('pebble')),
+    ('crack', words('crack')),
+    ('source', words('source')),
+    ('"offset pebble"', words('offset', 'pebble')),
+    ('"road striping"', words('road', 'striping')),
+    ('en-echelon', words('en', 'echelon')),
+    ('strip*', words('strip', prefix=True)),
+    ('fract*', words('fract', prefix=True)),
+])
+def test_queries_match_scan(mapper, consolidated, query, pattern):
+    events = mapper.record_events(consolidated)
+    index = mapper.build_text_index(consolidated)
+
+    expected = scan(consolidated, events, pattern)
+    assert expected
+    assert index.query(query).tolist() == expected
+    assert index.query(query, events=['Ridgecrest']).tolist() == scan(consolidated, events, pattern, 'Ridgecrest')
+    assert index.query(query, start='2019-07-06', end='2019-07-10').tolist() == \
+        scan(consolidated, events, pattern, start='2019-07-06', end='2019-07-10')
+
+
+def test_combined_clauses_match_scan(mapper, consolidated):
+    events = mapper.record_events(consolidated)
+    index = mapper.build_text_index(consolidated)
+
+    expected = sorted(set(scan(consolidated, events, words('road'))) &
+                      set(scan(consolidated, events, words('strip', prefix=True))))
+    assert expected
+    assert index.query('road strip*').tolist() == expected
+
+    expected = sorted(set(scan(consolidated, events, words('scarp', 'offset'), 'Ridgecrest', start='2019-07-06')) &
+                      set(scan(consolidated, events, words('fract', prefix=True))))
+    assert expected
+    assert index.query('"scarp offset" fract*', events=['Ridgecrest'], start='2019-07-06').tolist() == expected
+
+
+def test_appended_records_match_full_build(mapper, consolidated, tmp_path):
+    events = mapper.record_events(consolidated)
+    index = ObservationTextIndex.from_frame(consolidated.iloc[:1500], events[:1500])
+
+    # Records re-delivered with edited notes replace their earlier postings
+    edited = consolidated.iloc[:100].assign(Notes='Source: Napa 2014; offset pebble')
+    index.add_records(edited, events[:100])
+    index.add_records(consolidated.iloc[1500:], events[1500:])
+    index.add_records(consolidated.iloc[:100], events[:100])
+
+    index.save(str(tmp_path / 'text_index.npz'))
+    reloaded = ObservationTextIndex.load(str(tmp_path / 'text_index.npz'))
+    full = ObservationTextIndex.from_frame(consolidated, events)
+    for query in ['pebble', '"offset pebble"', 'fract*', 'crack', '"en echelon"']:
+        assert reloaded.query(query).tolist() == full.query(query).tolist(), query
+    assert len(reloaded) == len(full)
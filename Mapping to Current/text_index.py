@@ -0,0 +1,234 @@
+"""
+Full-Text Index for Mapped Earthquake Observations
+Inverted index over free-text observation fields supporting term, phrase and prefix queries
+"""
+
+import re
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+TEXT_FIELDS = ['Notes', 'Vector_Offset_Feature_Notes', '_observed_feature']
+
+TOKEN_PATTERN = r'[a-z0-9]+'
+
+# "Source: Napa 2014; " added by the mapper is event identity, filtered by event instead of indexed
+SOURCE_PREFIX = r'^source: [^;]*;?'
+
+# Postings are keyed by term in the high bits and document in the low bits; positions of each
+# field start FIELD_GAP apart so phrases never match across fields
+DOC_STRIDE = 1 << 32
+FIELD_GAP = 1 << 16
+POSITION_STRIDE = 1 << 20
+
+NO_DATE = np.iinfo(np.int64).min
+
+
+def utc_ns(value):
+    """Nanoseconds since the epoch of a date bound; naive bounds are taken as UTC"""
+    value = pd.Timestamp(value)
+    return (value.tz_localize('UTC') if value.tzinfo is None else value.tz_convert('UTC')).value
+
+
+def tokenize(text):
+    """Lower-cased alphanumeric tokens of a query string"""
+    return re.findall(TOKEN_PATTERN, text.lower())
+
+
+class ObservationTextIndex:
+    """Positional inverted index returning OBJECTIDs for text queries"""
+
+    def __init__(self, fields=None):
+        self.fields = fields or TEXT_FIELDS
+        # Term ids are assigned in order of first appearance so existing postings never move
+        self.terms = []
+        self.term_ids = {}
+        self.sorted_terms = None
+        self.keys = np.empty(0, dtype=np.int64)
+        self.positions = np.empty(0, dtype=np.int32)
+        # One entry per added document; replaced documents keep their slot but lose their postings
+        self.object_ids = np.empty(0, dtype=np.int64)
+        self.events = np.empty(0, dtype=np.int16)
+        self.dates = np.empty(0, dtype=np.int64)
+        self.event_names = []
+
+    def __len__(self):
+        return len(np.unique(self.keys % DOC_STRIDE))
+
+    @classmethod
+    def from_frame(cls, df, events=None, fields=None):
+        """Build an index from a mapped or consolidated dataset"""
+        index = cls(fields)
+        index.add_records(df, events)
+        return index
+
+    def tokenize_frame(self, df):
+        """Row positions, tokens and field-offset positions of every token in the indexed fields"""
+        rows, tokens, positions = [], [], []
+        for field_number, field in enumerate(self.fields):
+            if field not in df.columns:
+                continue
+            text = df[field].astype(object).where(df[field].notna(), '').astype(str).str.lower()
+            text = text.reset_index(drop=True)
+            if field == 'Notes':
+                text = text.str.replace(SOURCE_PREFIX, '', regex=True)
+            field_tokens = text.str.findall(TOKEN_PATTERN).explode().dropna()
+            rows.append(field_tokens.index.to_numpy())
+            tokens.append(field_tokens.to_numpy())
+            positions.append(field_tokens.groupby(level=0).cumcount().to_numpy() + field_number * FIELD_GAP)
+        if not rows:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=object), np.empty(0, dtype=np.int64)
+        return np.concatenate(rows), np.concatenate(tokens), np.concatenate(positions)
+
+    def term_id_array(self, tokens):
+        """Term ids of tokens, adding unseen terms to the vocabulary"""
+        for term in pd.unique(tokens):
+            if term not in self.term_ids:
+                self.term_ids[term] = len(self.terms)
+                self.terms.append(term)
+                self.sorted_terms = None
+        return pd.Series(tokens).map(self.term_ids).to_numpy(dtype=np.int64)
+
+    def event_codes(self, events, n_rows):
+        """Integer codes of per-record event names"""
+        events = pd.Series(events if events is not None and not isinstance(events, str) else [events] * n_rows)
+        for name in pd.unique(events.dropna()):
+            if name not in self.event_names:
+                self.event_names.append(name)
+        codes = events.map({name: code for code, name in enumerate(self.event_names)})
+        return codes.fillna(-1).to_numpy(dtype=np.int16)
+
+    def add_records(self, df, events=None, date_column='_obs_date'):
+        """Add new records to the index, replacing any with the same OBJECTID"""
+        if events is None and 'event' in df.columns:
+            events = df['event'].to_numpy()
+        object_ids = pd.to_numeric(df['OBJECTID'], errors='coerce').to_numpy(dtype=np.int64)
+
+        # Drop postings of documents being replaced
+        if len(self.keys):
+            replaced = np.flatnonzero(np.isin(self.object_ids, object_ids))
+            if len(replaced):
+                keep = ~np.isin(self.keys % DOC_STRIDE, replaced)
+                self.keys, self.positions = self.keys[keep], self.positions[keep]
+
+        # Register the new documents
+        first_doc = len(self.object_ids)
+        if date_column in df.columns:
+            dates = pd.to_datetime(df[date_column], utc=True, errors='coerce')
+            dates = np.where(dates.isna(), NO_DATE, dates.to_numpy(dtype='datetime64[ns]').astype(np.int64))
+        else:
+            dates = np.full(len(df), NO_DATE, dtype=np.int64)
+        self.object_ids = np.concatenate([self.object_ids, object_ids])
+        self.events = np.concatenate([self.events, self.event_codes(events, len(df))])
+        self.dates = np.concatenate([self.dates, dates])
+
+        # Sort only the new postings, then merge them into the sorted arrays
+        rows, tokens, positions = self.tokenize_frame(df)
+        keys = self.term_id_array(tokens) * DOC_STRIDE + first_doc + rows
+        order = np.lexsort((positions, keys))
+        keys, positions = keys[order], positions[order].astype(np.int32)
+        insert_at = np.searchsorted(self.keys, keys, side='right')
+        self.keys = np.insert(self.keys, insert_at, keys)
+        self.positions = np.insert(self.positions, insert_at, positions)
+        logger.info(f"Text index: added {len(df)} records, {len(keys)} tokens ({len(self.terms)} terms)")
+
+    def postings(self, term_ids):
+        """Document and position arrays of all postings of the given term ids"""
+        term_ids = np.asarray(term_ids, dtype=np.int64)
+        starts = np.searchsorted(self.keys, term_ids * DOC_STRIDE, side='left')
+        ends = np.searchsorted(self.keys, (term_ids + 1) * DOC_STRIDE, side='left')
+        spans = [np.arange(start, end) for start, end in zip(starts, ends) if end > start]
+        found = np.concatenate(spans) if spans else np.empty(0, dtype=np.int64)
+        return self.keys[found] % DOC_STRIDE, self.positions[found].astype(np.int64)
+
+    def term_docs(self, term):
+        """Documents containing a term"""
+        term_id = self.term_ids.get(term.lower())
+        if term_id is None:
+            return np.empty(0, dtype=np.int64)
+        return np.unique(self.postings([term_id])[0])
+
+    def prefix_docs(self, prefix):
+        """Documents containing any term starting with prefix"""
+        if self.sorted_terms is None:
+            terms = np.array(self.terms, dtype=str)
+            order = np.argsort(terms)
+            self.sorted_terms = (terms[order], order)
+        terms, order = self.sorted_terms
+        prefix = prefix.lower()
+        start = np.searchsorted(terms, prefix, side='left')
+        end = np.searchsorted(terms, prefix + '\U0010ffff', side='left')
+        return np.unique(self.postings(order[start:end])[0])
+
+    def phrase_docs(self, phrase):
+        """Documents containing the tokens of a phrase consecutively within one field"""
+        tokens = tokenize(phrase)
+        if not tokens or any(token not in self.term_ids for token in tokens):
+            return np.empty(0, dtype=np.int64)
+
+        # Align every token's postings to the position the phrase would start at
+        matches = None
+        for offset, token in enumerate(tokens):
+            docs, positions = self.postings([self.term_ids[token]])
+            starts = docs * POSITION_STRIDE + positions - offset
+            matches = starts if matches is None else np.intersect1d(matches, starts, assume_unique=True)
+        return np.unique(matches // POSITION_STRIDE)
+
+    def filter_docs(self, docs, events=None, start=None, end=None):
+        """Restrict documents to events and a UTC date range [start, end)"""
+        keep = np.ones(len(docs), dtype=bool)
+        if events:
+            codes = [self.event_names.index(name) for name in events if name in self.event_names]
+            keep &= np.isin(self.events[docs], codes)
+        dates = self.dates[docs]
+        if start is not None:
+            keep &= (dates != NO_DATE) & (dates >= utc_ns(start))
+        if end is not None:
+            keep &= (dates != NO_DATE) & (dates < utc_ns(end))
+        return docs[keep]
+
+    def query(self, text, events=None, start=None, end=None):
+        """OBJECTIDs of records matching every clause: bare terms, "quoted phrases" and prefix* terms"""
+        clauses = re.findall(r'"([^"]*)"|(\S+)', text)
+        docs = None
+        for phrase, word in clauses:
+            if phrase:
+                clause_docs = self.phrase_docs(phrase)
+            elif word.endswith('*'):
+                clause_docs = self.prefix_docs(''.join(tokenize(word[:-1])))
+            elif len(tokenize(word)) > 1:
+                # Hyphenated or punctuated words match as phrases, as they are tokenized
+                clause_docs = self.phrase_docs(word)
+            else:
+                clause_docs = self.term_docs(''.join(tokenize(word)))
+            docs = clause_docs if docs is None else np.intersect1d(docs, clause_docs, assume_unique=True)
+
+        if docs is None:
+            return np.empty(0, dtype=np.int64)
+        return np.sort(self.object_ids[self.filter_docs(docs, events, start, end)])
+
+    def save(self, file_path):
+        """Persist the index as a compressed .npz file"""
+        np.savez_compressed(file_path, fields=np.array(self.fields, dtype=str),
+                            terms=np.array(self.terms, dtype=str), keys=self.keys, positions=self.positions,
+                            object_ids=self.object_ids, events=self.events, dates=self.dates,
+                            event_names=np.array(self.event_names, dtype=str))
+        logger.info(f"Text index saved to: {file_path}")
+
+    @classmethod
+    def load(cls, file_path):
+        """Load an index saved with save()"""
+        with np.load(file_path) as data:
+            index = cls(data['fields'].tolist())
+            index.terms = data['terms'].tolist()
+            index.term_ids = {term: term_id for term_id, term in enumerate(index.terms)}
+            index.keys = data['keys']
+            index.positions = data['positions']
+            index.object_ids = data['object_ids']
+            index.events = data['events']
+            index.dates = data['dates']
+            index.event_names = data['event_names'].tolist()
+        return index